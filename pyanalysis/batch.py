@@ -0,0 +1,222 @@
+'''
+Runs the notebook analyses over every session in a TaskController data tree
+(data/<subject>/<task>/<task>HH_MM_SSonMM-DD-YYYY.tsv) and writes the
+per-subject condition averages into one table.
+
+usage: python batch.py DATA_DIR [-o results.tsv] [-j WORKERS]
+                       [--tpre -0.3] [--tpost 8] [--rate 60] [--cache DIR]
+
+Each session is prepped, resampled onto a common time grid (see
+resample.py), epoched around its task's event (moved by the saved offset of
+each sound, as in the notebooks), baseline corrected over [-inf, 0) and
+averaged per condition, so sessions can be averaged per subject. Sessions that fail are listed at the end without stopping the
+run. A session saved both as .tsv and .npz is read from the .npz, and one
+saved without dense event columns gets them from its events file. With
+--cache, prepared sessions are kept in DIR (see cache.py) and reused by
+later runs.
+'''
+import argparse
+import multiprocessing
+import os
+import sys
+import traceback
+import warnings
+import numpy as np
+import pandas as pd
+import cache
+import resample
+import utils
+
+# task folder names (as made by TaskController) and task column values
+TASK_NAMES = {'darktest': 'darktest', 'lighttest': 'lighttest',
+              'PST': 'pst', 'pst': 'pst', 'revlearn': 'revlearn',
+              'oddball': 'oddball', 'ImageTest': 'image_test',
+              'image_test': 'image_test'}
+
+
+def darktest_conditions(df, nevt):
+    return ['dark'] * nevt
+
+
+def lighttest_conditions(df, nevt):  # each flash has its own intensity
+    return ['flash%d' % i for i in range(nevt)]
+
+
+def oddball_conditions(df, nevt):
+    isodd = df['trialvec'].dropna().values[:nevt] == 1
+    return np.where(isodd, 'oddball', 'standard')
+
+
+def revlearn_conditions(df, nevt):
+    iscorrect = df['correct'].dropna().values[:nevt] == 1
+    return np.where(iscorrect, 'correct', 'incorrect')
+
+
+def image_conditions(df, nevt):
+    isfear = df['isfear'].dropna().values[:nevt] == 1
+    return np.where(isfear, 'fear', 'neutral')
+
+# event column to epoch around and condition labels of each trial, per task.
+# the pst has no events, so the whole session is one curve
+TASKS = {'darktest': ('ontime', darktest_conditions),
+         'lighttest': ('offtime', lighttest_conditions),
+         'oddball': ('soundtime', oddball_conditions),
+         'revlearn': ('soundtime', revlearn_conditions),
+         'image_test': ('imagetime', image_conditions),
+         'pst': (None, None)}
+# offset (ms) saved with each event of a column, added to the event's time
+# as the notebooks do with utils.shift_by_latency
+OFFSET_COLUMNS = {'soundtime': 'soundoffset'}
+
+
+def find_sessions(root):
+    """
+    list (subject, task folder, path) for every session file under root
+    """
+    sessions = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        rel = os.path.relpath(dirpath, root).split(os.sep)
+        if len(rel) != 2:
+            continue
+        subject, folder = rel
+        for filename in sorted(filenames):
+            stem, ext = os.path.splitext(filename)
+            if ext not in ('.tsv', '.npz') or stem.endswith('.events'):
+                continue
+            key = os.path.join(dirpath, stem)
+            if ext == '.npz' or key not in sessions:
+                sessions[key] = (subject, folder, os.path.join(dirpath, filename))
+    return [sessions[key] for key in sorted(sessions)]
+
+
+def detect_task(folder, df):
+    if 'task' in df and len(df['task'].dropna()) > 0:
+        task = str(df['task'].dropna().iloc[0])
+    else:
+        task = folder
+    if task not in TASK_NAMES:
+        raise ValueError('unknown task %r' % task)
+    return TASK_NAMES[task]
+
+
+def condition_means(df, task, params):
+    """
+    mean baseline-corrected MeanPupil curve per condition, on a grid of
+    params['rate'] Hz from tpre to tpost, with the trial count of each
+    """
+    event_column, conditions = TASKS[task]
+    session = resample.resample_frame(df, params['rate'], ['MeanPupil'])
+    if event_column is None:
+        return {'session': (session.index.values,
+                            session['MeanPupil'].values, 1)}
+
+    if event_column in OFFSET_COLUMNS:
+        df = utils.shift_by_latency(df, event_column,
+                                    OFFSET_COLUMNS[event_column])
+    df = utils.timestamp_to_seconds(df, event_column, 'etimes')
+    split = resample.epochs(session, params['rate'], df['etimes'],
+                            params['tpre'], params['tpost'])
+    norm = utils.baseline_correct(split.data, split.times,
+                                  [float('-inf'), 0], 'subtract')[:, :, 0]
+    labels = np.asarray(conditions(df, len(split.events)))
+    means = {}
+    for label in np.unique(labels):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            curve = np.nanmean(norm[labels == label], axis=0)
+        means[label] = (split.times.values, curve, (labels == label).sum())
+    return means
+
+
+def analyze_session(job):
+    """
+    run one session; returns (path, table, None, hits) or
+    (path, None, error, hits), hits being 1 if the prepared session came from
+    the cache
+    """
+    subject, folder, path, params = job
+    prepared = cache.PrepCache(params['cache']) if params.get('cache') else None
+    try:
+        if prepared is not None:
+            df = prepared.prepare(path)
+        else:
+            df = utils.prepdata(utils.read_session(path))
+        df = utils.add_event_columns(df, path)  # if saved without them
+        task = detect_task(folder, df)
+        rows = []
+        for condition, (grid, curve, ntrials) in sorted(
+                condition_means(df, task, params).items()):
+            rows.append(pd.DataFrame({'subject': subject, 'task': task,
+                                      'session': os.path.basename(path),
+                                      'condition': condition, 'time': grid,
+                                      'pupil': curve, 'ntrials': ntrials}))
+        hits = prepared.hits if prepared is not None else 0
+        return path, pd.concat(rows, ignore_index=True), None, hits
+    except Exception:
+        hits = prepared.hits if prepared is not None else 0
+        return path, None, traceback.format_exc(), hits
+
+
+def aggregate(tables):
+    """
+    average the session curves of each subject, task and condition
+    """
+    sessions = pd.concat(tables, ignore_index=True)
+    keys = ['subject', 'task', 'condition', 'time']
+    grouped = sessions.groupby(keys, sort=True)
+    results = grouped['pupil'].mean().to_frame()
+    results['nsessions'] = grouped['session'].nunique()
+    results['ntrials'] = grouped['ntrials'].sum()
+    return results.reset_index()
+
+
+def run(root, params, workers=None):
+    jobs = [session + (params,) for session in find_sessions(root)]
+    if workers == 1:
+        outcomes = map(analyze_session, jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            outcomes = pool.map(analyze_session, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    tables = [table for path, table, error, hits in outcomes
+              if table is not None]
+    failures = [(path, error) for path, table, error, hits in outcomes
+                if error is not None]
+    hits = sum(hits for path, table, error, hits in outcomes)
+    results = aggregate(tables) if tables else None
+    return results, len(jobs), failures, hits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('root', help='data directory (data/<subject>/<task>)')
+    parser.add_argument('-o', '--output', default='results.tsv')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='processes to use (default: one per cpu)')
+    parser.add_argument('--tpre', type=float, default=-0.3)
+    parser.add_argument('--tpost', type=float, default=8)
+    parser.add_argument('--rate', type=float, default=60,
+                        help='rate (Hz) of the common time grid')
+    parser.add_argument('--cache', metavar='DIR', default=None,
+                        help='directory to cache prepared sessions in')
+    args = parser.parse_args(argv)
+    params = {'tpre': args.tpre, 'tpost': args.tpost, 'rate': args.rate,
+              'cache': args.cache}
+
+    results, nsessions, failures, hits = run(args.root, params, args.workers)
+    for path, error in failures:
+        print 'FAILED %s\n%s' % (path, error)
+    print '%d of %d sessions analyzed' % (nsessions - len(failures), nsessions)
+    if args.cache:
+        print '%d sessions from the cache, %d prepared' % (hits, nsessions - hits)
+    if results is not None:
+        results.to_csv(args.output, sep='\t', index=False)
+        print 'results written to', args.output
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+'''
+Timings for the analysis pipeline on the bundled data files.
+
+usage: python bench.py [name ...]   (runs every benchmark if none are given)
+'''
+import math
+import os
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+import smoothing
+import utils
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DATA_FILES = ['darktest', 'lighttest', 'oddball', 'revlearn', 'PST']
+
+
+def timeit(func, repeat=3):  # best wall time of repeat calls, and last result
+    best = float('inf')
+    for i in range(repeat):
+        start = time.time()
+        result = func()
+        best = min(best, time.time() - start)
+    return best, result
+
+
+def report(name, old, new):
+    print '%-12s %9.4fs %9.4fs %7.1fx' % (name, old, new, old / new)
+
+
+def bench_read_tsv():
+    print 'read_tsv vs from_csv + convert_tuples'
+    for name in DATA_FILES:
+        path = os.path.join(DATA_PATH, name + '.tsv')
+
+        def old():
+            return utils.convert_tuples(pd.DataFrame.from_csv(path, sep='\t'))
+
+        old_time, old_df = timeit(old)
+        new_time, new_df = timeit(lambda: utils.read_tsv(path))
+        # same values as the tuples parsed by string_to_tuple
+        for column, coords in utils.TUPLE_COLUMNS:
+            if column in old_df:
+                xyz = np.array(old_df[column].tolist())
+                for i, c in enumerate(coords):
+                    assert np.array_equal(xyz[:, i],
+                                          new_df[column + '_' + c].values)
+        report(name, old_time, new_time)
+
+
+def cleanseries_loop(data):  # cleanseries before clean_pupils, for reference
+    should_clean = ('LeftPupil', 'RightPupil')
+    if data.name not in should_clean:
+        return data
+
+    bad = (data == -1)
+
+    dd = data.diff()
+    sig = np.median(np.absolute(dd) / 0.67449)
+    th = 5
+    disc = np.absolute(dd) > th * sig
+
+    to_remove = np.nonzero(bad | disc)[0]
+    up_one = range(len(to_remove))
+    for i in range(len(to_remove)):
+        up_one[i] = to_remove[i] + 1
+    down_one = range(len(to_remove))
+    for i in range(len(to_remove)):
+        down_one[i] = to_remove[i] - 1
+    isolated = np.intersect1d(up_one, down_one)
+
+    allbad = np.union1d(to_remove, isolated)
+
+    newdat = pd.Series(data)
+    newdat[allbad] = np.nan
+
+    goodinds = np.nonzero(np.invert(np.isnan(newdat)))[0]
+    if len(goodinds) == 0:
+        print "Not enough good data to clean. Aborting."
+        return data
+    else:
+        return pd.Series.interpolate(newdat, method='linear')
+
+
+def bench_clean():
+    print 'clean_pupils vs df.apply(cleanseries)'
+    for name in DATA_FILES:
+        raw = utils.convert_tuples(
+            utils.read_tsv(os.path.join(DATA_PATH, name + '.tsv')).reset_index())
+        old_time, old_df = timeit(lambda: raw.copy().apply(cleanseries_loop))
+        new_time, new_df = timeit(lambda: utils.clean_pupils(raw.copy()))
+        for column in ('LeftPupil', 'RightPupil'):
+            assert np.allclose(old_df[column], new_df[column], rtol=0,
+                               atol=0, equal_nan=True)
+        report(name, old_time, new_time)
+
+
+def splitseries_loop(ser, ts, t_pre, t_post, t0=0.0):  # for reference
+    xx = ser.values.squeeze()  # convert to 1d numpy array
+    tt = ser.index
+    nevt = ts.dropna().size
+
+    if t_pre < 0:
+        negstart = utils.find_closest(tt, -t_pre)
+        nend = utils.find_closest(tt, t_post)
+        negslice = slice(1, negstart)
+        posslice = slice(0, nend)
+        bin_t = (-tt[negslice][::-1]).append(tt[posslice])
+    else:
+        nstart = utils.find_closest(tt, t_pre)
+        nend = utils.find_closest(tt, t_post)
+        nslice = slice(nstart, nend)
+        bin_t = tt[nslice]
+
+    evtrel = ts - t0
+
+    elist = []
+    for time in evtrel:
+        if math.isnan(time):
+            break
+        start_index = utils.find_closest(tt, t_pre + time)
+        end_index = utils.find_closest(tt, t_post + time)
+        diff = (end_index - start_index) - len(bin_t)
+        ss = slice(start_index, end_index - diff)
+        elist.append(pd.DataFrame(xx[ss], columns=[time]))
+    alltrials = pd.concat(elist, axis=1)
+    alltrials = alltrials.set_index(bin_t)
+    alltrials.index.name = 'time'
+    alltrials.columns = pd.Index(np.arange(nevt), name='trial')
+    return alltrials
+
+
+# event column of each file used for epoching
+EVENT_COLUMNS = {'darktest': 'ontime', 'lighttest': 'offtime',
+                 'oddball': 'soundtime', 'revlearn': 'soundtime'}
+
+
+def prepared(name):  # prepped frame with event times in seconds as 'etimes'
+    df = utils.prepdata(utils.read_tsv(os.path.join(DATA_PATH, name + '.tsv')))
+    return utils.timestamp_to_seconds(df, EVENT_COLUMNS[name], 'etimes')
+
+
+def bench_epochs():
+    print 'evtsplit vs splitseries per column'
+    for name in DATA_FILES:
+        if name not in EVENT_COLUMNS:
+            continue
+        df = prepared(name)
+
+        def old():
+            return [splitseries_loop(df[column], df['etimes'], -0.3, 8)
+                    for column in df.columns]
+
+        old_time, old_chunks = timeit(old)
+        new_time, (new_chunks, idx) = timeit(
+            lambda: utils.evtsplit(df, df['etimes'], -0.3, 8))
+        for old_chunk, new_chunk in zip(old_chunks, new_chunks):
+            assert np.array_equal(old_chunk.index, new_chunk.index)
+            assert np.allclose(old_chunk.values.astype(float),
+                               new_chunk.values.astype(float), equal_nan=True)
+        report(name, old_time, new_time)
+
+
+def basenorm_loop(chunklist, idx, t_int, flag):  # for reference
+    norm_chunks = list()
+    for df in chunklist:
+        t_axis = df.index
+        sel = np.logical_and(t_axis >= t_int[0], t_axis < t_int[1])
+        base = df[sel]
+        baseline = base.mean()
+        norm_data = pd.DataFrame()
+
+        if flag == 0:
+            for column in baseline.index:
+                norm_data[column] = df[column] - baseline[column]
+        elif flag == 1:
+            for column in baseline.index:
+                norm_data[column] = df[column] / baseline[column]
+        norm_chunks.append(norm_data)
+    return norm_chunks
+
+
+def bench_basenorm():
+    print 'basenorm vs per-chunk loop'
+    for name in DATA_FILES:
+        if name not in EVENT_COLUMNS:
+            continue
+        df = prepared(name)
+        chunklist, idx = utils.evtsplit(df, df['etimes'], -0.3, 8)
+        t_int = [float('-inf'), 0]
+        old_time, old_chunks = timeit(
+            lambda: basenorm_loop(chunklist, idx, t_int, 0))
+        new_time, new_chunks = timeit(
+            lambda: utils.basenorm(chunklist, idx, t_int, 0))
+        for old_chunk, new_chunk in zip(old_chunks, new_chunks):
+            assert np.allclose(old_chunk.values.astype(float),
+                               new_chunk.values.astype(float), equal_nan=True)
+        report(name, old_time, new_time)
+
+
+def gauss_convolve_direct(x, sigma):  # gauss_convolve before smoothing
+    edge = int(math.ceil(5 * sigma))
+    fltr = norm.pdf(range(-edge, edge), loc=0, scale=sigma)
+    fltr = fltr / sum(fltr)
+
+    buff = np.ones((1, edge))[0]
+
+    szx = x.size
+
+    xx = np.append((buff * x[0]), x)
+    xx = np.append(xx, (buff * x[-1]))
+
+    y = np.convolve(xx, fltr, mode='valid')
+    y = y[:szx]
+    return y
+
+
+def bench_smooth():
+    print 'smoothing.smooth vs gauss_convolve (smwid, 3 series of 8 s at 300 Hz)'
+    np.random.seed(0)
+    series = np.random.randn(3, 300 * 8).cumsum(axis=1)
+    for smwid in (2, 10, 30, 100, 300):
+        old_time, old = timeit(
+            lambda: [gauss_convolve_direct(x, smwid) for x in series])
+        new_time, new = timeit(lambda: smoothing.smooth(series, smwid))
+        assert np.allclose(old, new, rtol=0, atol=1e-3 * np.ptp(series))
+        method = smoothing.pick_method(series, smwid)
+        report('%d (%s)' % (smwid, method), old_time, new_time)
+
+
+
+def bench_events():
+    print 'read_events vs the dense event columns of read_tsv'
+    for name in DATA_FILES:
+        path = os.path.join(DATA_PATH, name + '.tsv')
+
+        def old():
+            df = utils.read_tsv(path)
+            return dict((column, df[column].dropna().values)
+                        for column in df.columns if column.endswith('time'))
+
+        old_time, columns = timeit(old)
+        new_time, (events, params) = timeit(lambda: utils.read_events(path))
+        assert list(events.columns[:2]) == ['Timestamp', 'event']
+        assert sorted(set(events['event'])) == sorted(columns)
+        for column, values in columns.items():
+            times = events['Timestamp'][events['event'] == column].values
+            assert np.array_equal(np.sort(values.astype(np.int64)), times)
+        report('%s (%d)' % (name, len(events)), old_time, new_time)
+
+
+BENCHMARKS = [('read_tsv', bench_read_tsv),
+              ('clean', bench_clean),
+              ('epochs', bench_epochs),
+              ('basenorm', bench_basenorm),
+              ('smooth', bench_smooth),
+              ('events', bench_events)]
+
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore')
+    names = sys.argv[1:] or [name for name, func in BENCHMARKS]
+    for name, func in BENCHMARKS:
+        if name in names:
+            func()
@@ -0,0 +1,164 @@
+'''
+On-disk cache of prepared sessions (utils.read_session + utils.prepdata).
+
+Entries are keyed by a hash of the raw data file's contents and of the
+cleaning parameters, so an unchanged file is loaded without parsing or
+cleaning it again, while an edited file or new parameters make a new entry.
+Frames are stored as pickles. When the cache grows past max_bytes, the least
+recently used entries are removed.
+
+    import cache
+    df = cache.load_prepared('data/oddball.tsv')
+    cache.default_cache().report()
+'''
+import hashlib
+import os
+import tempfile
+import pandas as pd
+import utils
+
+# bump when read_session/prepdata change what they return, so that entries
+# made by older code are not used
+VERSION = '1'
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.pupilcache')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+SUFFIX = '.pkl'
+
+
+def file_hash(path, blocksize=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(blocksize)
+        while block:
+            digest.update(block)
+            block = f.read(blocksize)
+    return digest.hexdigest()
+
+
+def params_hash(clean_args):
+    text = repr(sorted(clean_args.items()))
+    return hashlib.sha1(VERSION + text).hexdigest()
+
+
+class PrepCache(object):
+
+    # directory: where entries are kept (made if missing)
+    # max_bytes: total size of the entries kept after each store
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # made meanwhile by another process
+                if not os.path.isdir(directory):
+                    raise
+
+    def entry(self, path, clean_args):
+        # file hash first, so all entries of a file share a prefix
+        name = '%s-%s%s' % (file_hash(path), params_hash(clean_args)[:16],
+                            SUFFIX)
+        return os.path.join(self.directory, name)
+
+    def prepare(self, path, **clean_args):
+        """
+        prepared frame of the data file at path, as
+        utils.prepdata(utils.read_session(path), **clean_args)
+        """
+        entry = self.entry(path, clean_args)
+        if os.path.isfile(entry):
+            try:
+                df = pd.read_pickle(entry)
+            except Exception:  # truncated or from another pandas; remake it
+                os.remove(entry)
+            else:
+                self.hits += 1
+                os.utime(entry, None)  # mark as recently used
+                return df
+        self.misses += 1
+        df = utils.prepdata(utils.read_session(path), **clean_args)
+        self.store(entry, df)
+        return df
+
+    def store(self, entry, df):
+        # write to a temporary file first so a crash or a concurrent reader
+        # never sees a partial entry
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            df.to_pickle(tmp)
+            os.rename(tmp, entry)
+        except Exception:
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):  # (last use, size, path) of every entry, oldest first
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SUFFIX):
+                entry = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(entry)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, st.st_size, entry))
+        return sorted(found)
+
+    def size(self):
+        return sum(size for used, size, entry in self.entries())
+
+    def evict(self):  # removes least recently used entries down to max_bytes
+        found = self.entries()
+        total = sum(size for used, size, entry in found)
+        for used, size, entry in found:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            try:
+                os.remove(entry)
+            except OSError:  # already removed by another process
+                continue
+            self.evictions += 1
+
+    def invalidate(self, path=None):
+        """
+        remove the entries of the data file at path (all parameters), or
+        every entry if path is None; returns the number removed
+        """
+        prefix = file_hash(path) + '-' if path is not None else ''
+        removed = 0
+        for used, size, entry in self.entries():
+            if os.path.basename(entry).startswith(prefix):
+                os.remove(entry)
+                removed += 1
+        return removed
+
+    def stats(self):
+        entries = self.entries()
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'bytes': sum(size for used, size, entry in entries)}
+
+    def report(self):
+        print ('cache %(hits)d hits, %(misses)d misses, %(evictions)d evicted;'
+               ' %(entries)d entries, %(bytes)d bytes' % self.stats())
+
+_default = None
+
+
+def default_cache():
+    global _default
+    if _default is None:
+        _default = PrepCache()
+    return _default
+
+
+def load_prepared(path, **clean_args):  # PrepCache.prepare on the default cache
+    return default_cache().prepare(path, **clean_args)
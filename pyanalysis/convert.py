@@ -0,0 +1,16 @@
+'''
+Converts TSV data files into the binary .npz session format, which loads
+much faster (see utils.load_session). The .npz is written next to each file.
+
+usage: python convert.py data/*.tsv
+'''
+import glob
+import sys
+import utils
+
+if __name__ == '__main__':
+    for pattern in sys.argv[1:]:
+        for tsv_path in glob.glob(pattern):
+            if tsv_path.endswith('.events.tsv'):  # sparse events, no samples
+                continue
+            print tsv_path, '->', utils.tsv_to_npz(tsv_path)
@@ -0,0 +1,137 @@
+'''
+Per-trial measures of the pupil response, for statistics across trials and
+sessions. Every feature is computed for all trials at once from a trials x
+time array, so it takes the same few array operations for a session with
+ten trials as for a stack of sessions with thousands.
+
+extract takes the epochs of one channel as they come out of evtsplit and
+basenorm (a time x trial frame), a utils.Epochs channel, or a trials x time
+array with its times, and returns one row per trial:
+
+peak            largest value after the event (within window)
+peak_latency    time of the peak (s)
+mean            mean over mean_window
+auc             area under the curve over window (value * s)
+slope           least squares slope over slope_window (value / s)
+half_recovery   time (s) at which the response is back down halfway from
+                the peak to the baseline, nan if it does not get there
+'''
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# columns that label trials in the data files, in the order they are joined
+TRIAL_COLUMNS = ('trialvec', 'correct', 'choice', 'isfear')
+
+
+def as_trials(epochs, times=None):  # (trials x time array, times)
+    if isinstance(epochs, pd.DataFrame):  # time x trial, from evtsplit
+        return epochs.values.T.astype(float), np.asarray(epochs.index,
+                                                          dtype=float)
+    return np.asarray(epochs, dtype=float), np.asarray(times, dtype=float)
+
+
+def first_true(mask):  # index of the first True of each row, -1 if none
+    idx = mask.argmax(axis=1)
+    idx[~mask.any(axis=1)] = -1
+    return idx
+
+
+def extract(epochs, times=None, window=(0, None), mean_window=(0.5, 2.0),
+            slope_window=(0, 1.0), baseline=0.0):
+    """
+    features of each trial of epochs (see module docstring). windows are
+    (start, end) in seconds from the event, with None for the end of the
+    epoch. baseline is the value the response starts from, i.e. 0 after
+    subtracting the baseline and 1 after dividing by it
+    """
+    data, times = as_trials(epochs, times)
+    ntrials = data.shape[0]
+
+    def select(span):
+        end = times[-1] if span[1] is None else span[1]
+        return (times >= span[0]) & (times <= end)
+
+    features = pd.DataFrame(index=pd.Index(np.arange(ntrials), name='trial'))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-nan trials
+
+        # peak and its latency
+        sel = select(window)
+        post = data[:, sel]
+        post_t = times[sel]
+        valid = ~np.isnan(post).all(axis=1)
+        peak_idx = np.zeros(ntrials, dtype=int)
+        peak_idx[valid] = np.nanargmax(post[valid], axis=1)
+        rows = np.arange(ntrials)
+        features['peak'] = np.where(valid, post[rows, peak_idx], np.nan)
+        features['peak_latency'] = np.where(valid, post_t[peak_idx], np.nan)
+
+        features['mean'] = np.nanmean(data[:, select(mean_window)], axis=1)
+
+        # trapezoids between neighbouring valid samples only
+        segments = (post[:, 1:] + post[:, :-1]) / 2 * np.diff(post_t)
+        features['auc'] = np.where(valid, np.nansum(segments, axis=1), np.nan)
+
+        # closed form least squares slope of each trial, leaving out nans
+        sel = select(slope_window)
+        y = data[:, sel]
+        mask = ~np.isnan(y)
+        x = np.where(mask, times[sel], 0.0)
+        n = mask.sum(axis=1)
+        xm = x.sum(axis=1) / n
+        ym = np.where(mask, y, 0.0).sum(axis=1) / n
+        dx = np.where(mask, x - xm[:, np.newaxis], 0.0)
+        dy = np.where(mask, y - ym[:, np.newaxis], 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            features['slope'] = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+        # first sample after the peak at or below halfway back to baseline
+        half = baseline + (features['peak'].values - baseline) / 2
+        after = np.arange(post.shape[1]) > peak_idx[:, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            back = after & (post <= half[:, np.newaxis])
+        idx = first_true(back)
+        features['half_recovery'] = np.where(valid & (idx >= 0),
+                                             post_t[idx], np.nan)
+    return features
+
+
+def trial_info(df, columns=TRIAL_COLUMNS, events=None, params=None):
+    """
+    the trial labels in a data frame with dense event columns (e.g. from
+    prepdata), one row per trial in the order they were recorded. labels
+    that are not columns of df, as in data files saved without dense event
+    columns, are taken from events and params as read by utils.read_events
+    """
+    info = pd.DataFrame()
+    for column in columns:
+        if column in df:
+            values = df[column].dropna()
+        elif events is not None and column in events:
+            values = events[column].dropna()
+        elif params is not None and column in params:
+            values = params[column]
+            if not isinstance(values, list):
+                values = [values]
+        else:
+            continue
+        info[column] = pd.Series(list(values))
+    return info
+
+
+def join_trials(features, info, columns=TRIAL_COLUMNS):
+    """
+    features with the trial labels of info (a frame such as from trial_info
+    or the rows of one event from utils.read_events, or a dict of lists)
+    added by trial order. labels of trials past the last epoch are dropped,
+    trials without a label get nan
+    """
+    features = features.copy()
+    for column in columns:
+        if column in info:
+            values = np.asarray(info[column])[:len(features)]
+            features[column] = pd.Series(values).reindex(
+                np.arange(len(features))).values
+    return features
@@ -0,0 +1,155 @@
+'''
+Puts sessions on a fixed-rate time grid, so that epochs from sessions (or
+trackers) with different or jittery sample rates share one time axis and can
+be stacked as arrays.
+
+Each channel is low-pass filtered first when the grid is coarser than the
+samples, so that faster fluctuations do not alias into the resampled data,
+and is then linearly interpolated onto the grid, except across gaps in the
+valid samples longer than max_gap, which stay nan. The grid is made of
+multiples of 1 / rate, so all sessions resampled at a rate line up.
+'''
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import as_strided
+from scipy import ndimage
+
+import utils
+
+# gaussian width (in grid steps) of the anti-alias filter: -3 dB at a quarter
+# of the grid rate and about -24 dB at its nyquist frequency
+ANTIALIAS_SIGMA = 0.75
+MAX_GAP = 0.1  # seconds without valid samples that are not interpolated
+RATE_TOLERANCE = 0.02  # grids this close to the sample rate are not filtered
+
+
+def grid(t_start, t_end, rate):  # multiples of 1 / rate in [t_start, t_end]
+    first = int(np.ceil(t_start * rate - 1e-9))
+    last = int(np.floor(t_end * rate + 1e-9))
+    return np.arange(first, last + 1) / float(rate)
+
+
+def antialias(times, values, rate):
+    """
+    values (samples x channels) low-pass filtered for resampling at rate,
+    if that is below the sample rate. nans are left out of the average
+    rather than spread, and points with less than half of their weight on
+    valid samples become nan
+    """
+    dt = np.median(np.diff(times))
+    # the grid must be coarser than the samples, beyond the jitter of a
+    # tracker's rate (e.g. 60 Hz data on a 60 Hz grid is left as it is)
+    if dt <= 0 or rate * dt > 1 - RATE_TOLERANCE:
+        return values
+    sigma = ANTIALIAS_SIGMA / rate / dt  # in samples
+    valid = ~np.isnan(values)
+    total = ndimage.gaussian_filter1d(np.where(valid, values, 0.0), sigma,
+                                      axis=0, mode='nearest')
+    weight = ndimage.gaussian_filter1d(valid.astype(float), sigma, axis=0,
+                                       mode='nearest')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(weight >= 0.5, total / weight, np.nan)
+
+
+def interpolate(times, values, points, max_gap=MAX_GAP):
+    """
+    linear interpolation of one channel at points, using only its valid
+    samples. points outside the samples, or between two valid samples more
+    than max_gap seconds apart, are nan
+    """
+    valid = ~np.isnan(values)
+    t = times[valid]
+    out = np.full(len(points), np.nan)
+    if len(t) == 0:
+        return out
+    out[:] = np.interp(points, t, values[valid])
+    right = np.searchsorted(t, points)  # first valid sample at or after
+    inside = (right > 0) & (right < len(t))
+    exact = np.zeros(len(points), dtype=bool)
+    exact[right < len(t)] = t[right[right < len(t)]] == points[right < len(t)]
+    gap = np.full(len(points), np.inf)
+    gap[inside] = t[right[inside]] - t[right[inside] - 1]
+    if max_gap is None:
+        max_gap = np.inf
+    out[~(exact | (gap <= max_gap))] = np.nan
+    return out
+
+
+def resample(times, values, rate, max_gap=MAX_GAP, antialias_filter=True):
+    """
+    values (samples, or samples x channels) at times (seconds, increasing)
+    on the grid of rate Hz covering them. returns (grid times, values)
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    flat = values.ndim == 1
+    if flat:
+        values = values[:, np.newaxis]
+    if antialias_filter and len(times) > 1:
+        values = antialias(times, values, rate)
+    points = grid(times[0], times[-1], rate)
+    out = np.empty((len(points), values.shape[1]))
+    for i in range(values.shape[1]):
+        out[:, i] = interpolate(times, values[:, i], points, max_gap)
+    return points, out[:, 0] if flat else out
+
+
+def resample_frame(df, rate, columns=None, max_gap=MAX_GAP,
+                   antialias_filter=True):
+    """
+    frame indexed by Seconds (e.g. from prepdata) resampled at rate Hz. by
+    default every float column but Timestamp is resampled
+    """
+    if columns is None:
+        columns = [column for column in df.columns
+                   if df[column].dtype.kind == 'f' and column != 'Timestamp']
+    points, values = resample(df.index.values, df[columns].values, rate,
+                              max_gap, antialias_filter)
+    return pd.DataFrame(values, index=pd.Index(points, name='Seconds'),
+                        columns=columns)
+
+
+def epochs(df, rate, events, t_pre, t_post, t0=0.0, columns=None):
+    """
+    utils.Epochs of the (t_pre, t_post) windows around each event in a
+    frame from resample_frame. each window starts at the grid point closest
+    to t_pre + event and all of them share the time axis
+    (round(t_pre * rate) + k) / rate, so epochs of any session at the same
+    rate can be stacked. the windows are views of a strided array, copied
+    once when picked; parts past either end of the session are nan
+    """
+    if columns is None:
+        columns = list(df.columns)
+    first = int(round(t_pre * rate))
+    nbins = int(round(t_post * rate)) - first
+    times = pd.Index((first + np.arange(nbins)) / float(rate), name='time')
+
+    evt = np.asarray(events, dtype=float)
+    isnan = np.nonzero(np.isnan(evt))[0]
+    if len(isnan) > 0:  # events stop at the first nan, as in utils.epochs
+        evt = evt[:isnan[0]]
+    starts = np.round((evt - t0 - df.index[0]) * rate).astype(int) + first
+
+    values = df[columns].values.astype(float)
+    pad = np.full((nbins, values.shape[1]), np.nan)
+    padded = np.concatenate([pad, values, pad])
+    windows = as_strided(padded,
+                         shape=(len(padded) - nbins + 1, nbins,
+                                padded.shape[1]),
+                         strides=(padded.strides[0],) + padded.strides)
+    data = windows[np.clip(starts + nbins, 0, len(windows) - 1)]
+    return utils.Epochs(data, times, columns, evt)
+
+
+def stack(split):
+    """
+    one utils.Epochs with the trials of all epochs in split, which must have
+    the same time axis and columns (e.g. from epochs at one rate)
+    """
+    for other in split[1:]:
+        if (not other.times.equals(split[0].times) or
+                not other.columns.equals(split[0].columns)):
+            raise ValueError('epochs have different time axes or columns')
+    return utils.Epochs(np.concatenate([s.data for s in split]),
+                        split[0].times, split[0].columns,
+                        np.concatenate([s.events for s in split]))
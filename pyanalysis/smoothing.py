@@ -0,0 +1,127 @@
+'''
+Gaussian smoothing of one or many series, choosing between a direct, an
+FFT-based and a recursive (IIR) implementation by kernel size. All of them
+reproduce utils.gauss_convolve: a kernel of 2 * ceil(5 * sigma) taps, the
+series extended with its end values, and the output lagging one sample
+behind a centred filter.
+'''
+import math
+import numpy as np
+from scipy import ndimage, signal
+from scipy.stats import norm
+
+# kernels longer than this many taps use the FFT, and longer than
+# IIR_TAPS the recursive approximation
+FFT_TAPS = 64
+IIR_TAPS = 2048
+
+_kernels = {}  # normalized kernel for each sigma
+
+
+def kernel(sigma):
+    if sigma not in _kernels:
+        edge = int(math.ceil(5 * sigma))
+        fltr = norm.pdf(np.arange(-edge, edge), loc=0, scale=sigma)
+        _kernels[sigma] = fltr / fltr.sum()
+    return _kernels[sigma]
+
+
+def pick_method(x, sigma):
+    if np.isnan(x).any():  # nan spreads through an FFT or recursive filter
+        return 'direct'
+    taps = len(kernel(sigma))
+    if taps > IIR_TAPS and sigma >= 0.5:
+        return 'iir'
+    elif taps > FFT_TAPS:
+        return 'fft'
+    return 'direct'
+
+
+def smooth(x, sigma, axis=-1, method='auto'):
+    """
+    smooth x (1-D, or many series stacked along the other axes) with a
+    gaussian of width sigma samples along axis. method is 'direct', 'fft',
+    'iir' (Deriche's recursive approximation, whose cost does not depend on
+    sigma) or 'auto' to choose by kernel size, or 'direct' if x has any nan
+    as nans only spread within a kernel width with it
+    """
+    x = np.asarray(x, dtype=float)
+    if method == 'auto':
+        method = pick_method(x, sigma)
+    if method == 'direct':
+        # origin=-1 gives the same alignment as np.convolve in gauss_convolve
+        return ndimage.convolve1d(x, kernel(sigma), axis=axis, mode='nearest',
+                                  origin=-1)
+    elif method == 'fft':
+        return fft_smooth(x, sigma, axis)
+    elif method == 'iir':
+        return iir_smooth(x, sigma, axis)
+    raise ValueError('unknown smoothing method: %s' % method)
+
+
+def pad_edges(x, edge, axis):  # extends x by edge copies of its end values
+    pad = [(0, 0)] * x.ndim
+    pad[axis] = (edge, edge)
+    return np.pad(x, pad, mode='edge')
+
+
+def fft_smooth(x, sigma, axis=-1):
+    fltr = kernel(sigma)
+    edge = len(fltr) // 2
+    szx = x.shape[axis]
+    xx = pad_edges(x, edge, axis)
+    nfft = 1 << int(math.ceil(math.log(xx.shape[axis] + len(fltr) - 1, 2)))
+    shape = [1] * x.ndim
+    shape[axis] = -1
+    spectrum = np.fft.rfft(fltr, nfft).reshape(shape)
+    y = np.fft.irfft(np.fft.rfft(xx, nfft, axis=axis) * spectrum, nfft,
+                     axis=axis)
+    # 'valid' part of the convolution, first szx samples
+    return np.take(y, np.arange(len(fltr) - 1, len(fltr) - 1 + szx), axis=axis)
+
+
+def iir_coefficients(sigma):
+    """
+    causal and anti-causal filters of Deriche's 4th order recursive
+    gaussian (1993), scaled so that together they have unit gain
+    """
+    a0, a1, b0, b1 = 1.68, 3.735, 1.783, 1.723
+    c0, c1, w0, w1 = -0.6803, -0.2598, 0.6318, 1.997
+    e0, e1 = math.exp(-b0 / sigma), math.exp(-b1 / sigma)
+    cos0, sin0 = math.cos(w0 / sigma), math.sin(w0 / sigma)
+    cos1, sin1 = math.cos(w1 / sigma), math.sin(w1 / sigma)
+
+    n0 = a0 + c0
+    n1 = (e1 * (c1 * sin1 - (c0 + 2 * a0) * cos1) +
+          e0 * (a1 * sin0 - (2 * c0 + a0) * cos0))
+    n2 = (2 * e0 * e1 * ((a0 + c0) * cos1 * cos0 - a1 * cos1 * sin0 -
+                         c1 * cos0 * sin1) +
+          c0 * e0 ** 2 + a0 * e1 ** 2)
+    n3 = (e1 * e0 ** 2 * (c1 * sin1 - c0 * cos1) +
+          e0 * e1 ** 2 * (a1 * sin0 - a0 * cos0))
+    d1 = -2 * e1 * cos1 - 2 * e0 * cos0
+    d2 = 4 * cos1 * cos0 * e0 * e1 + e1 ** 2 + e0 ** 2
+    d3 = -2 * cos0 * e0 * e1 ** 2 - 2 * cos1 * e1 * e0 ** 2
+    d4 = (e0 * e1) ** 2
+
+    a = [1, d1, d2, d3, d4]
+    causal = [n0, n1, n2, n3]
+    anticausal = [0, n1 - d1 * n0, n2 - d2 * n0, n3 - d3 * n0, -d4 * n0]
+    gain = (sum(causal) + sum(anticausal)) / sum(a)
+    return ([n / gain for n in causal], [n / gain for n in anticausal], a)
+
+
+def iir_smooth(x, sigma, axis=-1):
+    causal, anticausal, a = iir_coefficients(sigma)
+    edge = int(math.ceil(5 * sigma))
+    szx = x.shape[axis]
+    xx = np.swapaxes(pad_edges(x, edge, axis), axis, -1)
+    # both passes start in the steady state of the constant padding
+    first, last = xx[..., :1], xx[..., ::-1][..., :1]
+    y = signal.lfilter(causal, a, xx,
+                       zi=signal.lfilter_zi(causal, a) * first)[0]
+    y += signal.lfilter(anticausal, a, xx[..., ::-1],
+                        zi=signal.lfilter_zi(anticausal, a) * last)[0][..., ::-1]
+    # lag one sample, as the direct kernel does
+    y = y[..., edge - 1:edge - 1 + szx]
+    return np.swapaxes(y, axis, -1)
@@ -0,0 +1,208 @@
+'''
+Cluster-based permutation test (Maris & Oostenveld, 2007) between two
+conditions over the time axis of their epochs, e.g. oddball vs standard
+trials. A t statistic is computed at every time point, neighbouring points
+past the threshold form clusters, and each cluster's mass (the sum of its t
+values) is compared with the largest cluster mass found when the trial labels
+are shuffled.
+
+The permutations are made in chunks: each chunk's shuffled labels are one
+matrix, so the sums of both groups at every time point, for every
+permutation, come from one matrix product. Chunks are spread over a process
+pool. Every chunk has its own seed drawn from seed, so the result is the same
+for any number of workers.
+
+bootstrap_band resamples trials the same way, for confidence bands of the
+mean of a condition (see utils.plot_with_sem).
+'''
+import multiprocessing
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy import stats as scipy_stats
+
+import features
+
+CHUNK = 500  # permutations (or bootstrap samples) per matrix product
+
+
+def chunk_jobs(n, chunk, seed):  # (size, seed) of each chunk of n draws
+    sizes = [chunk] * (n // chunk)
+    if n % chunk:
+        sizes.append(n % chunk)
+    seeds = np.random.RandomState(seed).randint(0, 2 ** 31 - 1, len(sizes))
+    return zip(sizes, seeds)
+
+
+def run_chunks(func, jobs, workers):  # func of each job, in a pool if asked
+    if workers == 1:
+        return map(func, jobs)
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(func, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def welch_t(sums, squares, counts, total, total_squares, total_counts):
+    """
+    welch t of group a against the rest, from the sums, sums of squares and
+    counts (permutations x time) of group a and the totals (time) over all
+    trials
+    """
+    n1 = counts
+    n2 = total_counts - counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m1 = sums / n1
+        m2 = (total - sums) / n2
+        v1 = (squares - n1 * m1 ** 2) / (n1 - 1)
+        v2 = (total_squares - squares - n2 * m2 ** 2) / (n2 - 1)
+        return (m1 - m2) / np.sqrt(v1 / n1 + v2 / n2)
+
+
+def cluster_masses(t, threshold):
+    """
+    mass of the cluster each point belongs to, for points above threshold
+    (positive clusters) and below -threshold (negative clusters), with the
+    running sum of each run of such points taken along the last axis in one
+    cumsum. returns the largest positive and negative (absolute) masses of
+    each row
+    """
+    t = np.nan_to_num(t)
+    largest = []
+    for sign in (1, -1):
+        st = sign * t
+        above = st > threshold
+        cs = np.cumsum(np.where(above, st, 0.0), axis=-1)
+        # cumsum at the last point not in a cluster, at or before each point
+        idx = np.arange(t.shape[-1])
+        last_gap = np.maximum.accumulate(np.where(above, -1, idx), axis=-1)
+        base = np.where(last_gap >= 0, np.take_along_axis(
+            cs, np.maximum(last_gap, 0), axis=-1), 0.0)
+        largest.append(np.where(above, cs - base, 0.0).max(axis=-1))
+    return largest
+
+
+def clusters(t, threshold):
+    """
+    (start, end, mass) of each run of t above threshold or below -threshold,
+    end being exclusive
+    """
+    found = []
+    for sign in (1, -1):
+        above = np.concatenate([[False], sign * np.nan_to_num(t) > threshold,
+                                [False]])
+        edges = np.flatnonzero(np.diff(above.astype(int)))
+        for start, end in zip(edges[::2], edges[1::2]):
+            found.append((start, end, t[start:end].sum()))
+    return sorted(found)
+
+
+def null_chunk(job):
+    """
+    largest cluster mass of each of n permutations of the labels, seeded
+    with seed; run in the pool
+    """
+    data, valid, na, threshold, n, seed = job
+    rnd = np.random.RandomState(seed)
+    # a random permutation per row: the first na of each go to group a
+    labels = (rnd.rand(n, data.shape[0]).argsort(axis=1) < na).astype(float)
+    t = welch_t(labels.dot(data), labels.dot(data ** 2), labels.dot(valid),
+                data.sum(axis=0), (data ** 2).sum(axis=0), valid.sum(axis=0))
+    positive, negative = cluster_masses(t, threshold)
+    return np.maximum(positive, negative)
+
+
+class ClusterResult(object):
+    """
+    outcome of cluster_test: t at each of times, the clusters found as a
+    frame (start, end (s), mass, p) and the largest cluster mass of each
+    permutation in null
+    """
+
+    def __init__(self, t, times, clusters, null):
+        self.t = t
+        self.times = times
+        self.clusters = clusters
+        self.null = null
+
+    def spans(self, alpha=0.05):  # (start, end) in s of significant clusters
+        sig = self.clusters[self.clusters['p'] < alpha]
+        return list(zip(sig['start'], sig['end']))
+
+
+def cluster_test(a, b, times=None, n_permutations=10000, alpha=0.05,
+                 threshold=None, seed=0, workers=1, chunk=CHUNK):
+    """
+    two-sided cluster permutation test between epochs a and b (trials x
+    time arrays with times, or time x trial frames such as norm_pupil_corr
+    in the notebooks). threshold is the |t| that points must pass to be in a
+    cluster, by default the two-sided alpha critical t for the trials
+    available. nans are left out of the sums at each time point. workers is
+    the number of processes (None for one per cpu)
+    """
+    a, times = features.as_trials(a, times)
+    b, _ = features.as_trials(b, times)
+    x = np.vstack([a, b])
+    valid = (~np.isnan(x)).astype(float)
+    data = np.where(valid > 0, x, 0.0)
+    na = len(a)
+    if threshold is None:
+        dof = max(len(x) - 2, 1)
+        threshold = scipy_stats.t.ppf(1 - alpha / 2.0, dof)
+
+    t = welch_t(data[:na].sum(axis=0), (data[:na] ** 2).sum(axis=0),
+                valid[:na].sum(axis=0), data.sum(axis=0),
+                (data ** 2).sum(axis=0), valid.sum(axis=0))
+
+    jobs = [(data, valid, na, threshold, n, s)
+            for n, s in chunk_jobs(n_permutations, chunk, seed)]
+    null = run_chunks(null_chunk, jobs, workers)
+    null = np.concatenate(null) if len(null) else np.zeros(0)
+
+    rows = []
+    step = np.median(np.diff(times)) if len(times) > 1 else 0.0
+    for start, end, mass in clusters(t, threshold):
+        p = (1 + (null >= abs(mass)).sum()) / float(len(null) + 1)
+        rows.append((times[start], times[end - 1] + step, mass, p))
+    found = pd.DataFrame(rows, columns=['start', 'end', 'mass', 'p'])
+    return ClusterResult(t, times, found, null)
+
+
+def bootstrap_chunk(job):
+    """
+    means (n x time) of n bootstrap samples of the trials, seeded with seed;
+    run in the pool
+    """
+    data, valid, n, seed = job
+    ntrials = data.shape[0]
+    rnd = np.random.RandomState(seed)
+    idx = rnd.randint(0, ntrials, (n, ntrials))  # trials drawn by each sample
+    # times each trial was drawn by each sample, so that the sums of all
+    # samples are one matrix product
+    offsets = ntrials * np.arange(n)[:, np.newaxis]
+    counts = np.bincount((idx + offsets).ravel(),
+                         minlength=n * ntrials).reshape(n, ntrials)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return counts.dot(data) / counts.dot(valid)
+
+
+def bootstrap_band(x, n_boot=2000, ci=95, seed=0, workers=1, chunk=CHUNK):
+    """
+    (low, high) percentile confidence band at each time point of the mean
+    of the trials of x (a time x trial frame, or trials x time array), from
+    n_boot resamples of the trials with replacement. only chunk resamples
+    are drawn at a time; workers is as in cluster_test
+    """
+    data, _ = features.as_trials(x, np.zeros(0))
+    valid = (~np.isnan(data)).astype(float)
+    data = np.where(valid > 0, data, 0.0)
+    jobs = [(data, valid, n, s) for n, s in chunk_jobs(n_boot, chunk, seed)]
+    means = np.vstack(run_chunks(bootstrap_chunk, jobs, workers))
+    tail = (100 - ci) / 2.0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-nan time points
+        low, high = np.nanpercentile(means, [tail, 100 - tail], axis=0)
+    return low, high
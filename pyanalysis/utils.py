@@ -1,45 +1,42 @@
 import numpy as np
 import pandas as pd
 import re
-import math
+import os
+import warnings
+import struct
+import zipfile
+from StringIO import StringIO
 import matplotlib.pyplot as plt
-from scipy.stats import norm
+import smoothing
+import stats
 
 
-def gauss_convolve(x, sigma):
-    edge = int(math.ceil(5 * sigma))
-    fltr = norm.pdf(range(-edge, edge), loc=0, scale=sigma)
-    fltr = fltr / sum(fltr)
+def gauss_convolve(x, sigma):  # see smoothing.smooth
+    return smoothing.smooth(x, sigma)
 
-    buff = np.ones((1, edge))[0]
 
-    szx = x.size
-
-    xx = np.append((buff * x[0]), x)
-    xx = np.append(xx, (buff * x[-1]))
-
-    y = np.convolve(xx, fltr, mode='valid')
-    y = y[:szx]
-    return y
-
-
-def plot_with_sem(x, smwid, flag, bin_t, color):
+# band is 'sem' for mean +/- sem, or 'bootstrap' for a ci % confidence band
+# from n_boot resamples of the trials (see stats.bootstrap_band), which is
+# better for the few trials of e.g. oddballs
+def plot_with_sem(x, smwid, flag, bin_t, color, spans=None, band='sem',
+                  n_boot=2000, ci=95, seed=0, workers=1):
     ntrials = x.columns.size
 
     xm = np.nanmean(x, 1)
-    sd = np.nanstd(x, 1)
-    effsamp = np.sum(np.logical_not(np.isnan(x)), 1)
-    sem = sd / np.sqrt(effsamp)
-    sem = list(sem)
-
-    if smwid != 0:  # smoothing goes here
-        xsm = gauss_convolve(xm, smwid)
-        xhi = gauss_convolve(xm + sem, smwid)
-        xlo = gauss_convolve(xm - sem, smwid)
+    if band == 'bootstrap':
+        lo, hi = stats.bootstrap_band(x, n_boot, ci, seed, workers)
+    else:
+        sd = np.nanstd(x, 1)
+        effsamp = np.sum(np.logical_not(np.isnan(x)), 1)
+        sem = sd / np.sqrt(effsamp)
+        lo, hi = xm - sem, xm + sem
+
+    if smwid != 0:  # smoothing goes here, all three series in one call
+        xsm, xhi, xlo = smoothing.smooth(np.vstack((xm, hi, lo)), smwid)
     else:
         xsm = xm
-        xhi = xm + sem
-        xlo = xm - sem
+        xhi = hi
+        xlo = lo
 
     plt.hold(True)
     if flag == 0:
@@ -58,41 +55,69 @@ def plot_with_sem(x, smwid, flag, bin_t, color):
             bin_t, xhi, '--', color=[i * 0.5 for i in color], linewidth=1.0)
         plt.plot(
             bin_t, xlo, '--', color=[i * 0.5 for i in color], linewidth=1.0)
+    # shaded time spans, e.g. significant clusters from stats.cluster_test
+    for start, end in spans or []:
+        plt.axvspan(start, end, color=color, alpha=0.1, linewidth=0)
     plt.hold(False)
 
 
-def cleanseries(data):
-    should_clean = ('LeftPupil', 'RightPupil')
-    if data.name not in should_clean:
-        return data
-
-    bad = (data == -1)
-
-    dd = data.diff()
-    sig = np.median(np.absolute(dd) / 0.67449)
-    th = 5
-    disc = np.absolute(dd) > th * sig
-
-    to_remove = np.nonzero(bad | disc)[0]
-    up_one = range(len(to_remove))
-    for i in range(len(to_remove)):
-        up_one[i] = to_remove[i] + 1
-    down_one = range(len(to_remove))
-    for i in range(len(to_remove)):
-        down_one[i] = to_remove[i] - 1
-    isolated = np.intersect1d(up_one, down_one)
-
-    allbad = np.union1d(to_remove, isolated)
+def clean_pupils(df, columns=('LeftPupil', 'RightPupil'), missing=-1, th=5,
+                 isolated=True, mad_skipna=False, empty_nan=False):
+    """
+    replace bad samples in the pupil columns of df with linear
+    interpolation, working on all columns at once. a sample is bad if it is
+    missing, if its jump from the previous sample is more than th robust
+    standard deviations (median absolute difference / 0.67449), or, with
+    isolated, if both of its neighbours are bad. th=None turns off the
+    discontinuity test. as in cleanseries, the median includes the leading
+    nan of the differences, which makes it nan (and the test a no-op) on
+    numpy >= 1.10; mad_skipna=True ignores the nan instead. leading bad
+    samples stay nan, trailing ones take the last good value. columns with
+    no good samples are left as they were, as in cleanseries, or become all
+    nan with empty_nan=True. df is changed in place and returned
+    """
+    columns = [column for column in columns if column in df]
+    data = df[columns].values.astype(float)
+    nsamp = data.shape[0]
+    if nsamp == 0:
+        return df
+
+    remove = data == missing
+    if th is not None:
+        dd = np.empty_like(data)
+        dd[0] = np.nan
+        dd[1:] = np.absolute(np.diff(data, axis=0)) / 0.67449
+        with np.errstate(invalid='ignore'):
+            if mad_skipna:
+                sig = np.nanmedian(dd, axis=0)
+            else:
+                sig = np.median(dd, axis=0)
+            remove |= dd > th * sig
+    allbad = remove.copy()
+    if isolated:
+        allbad[1:-1] |= remove[:-2] & remove[2:]
+    data[allbad] = np.nan
+
+    good = ~np.isnan(data)
+    pos = np.arange(nsamp)
+    for k, column in enumerate(columns):
+        goodinds = pos[good[:, k]]
+        if len(goodinds) == 0:
+            print "Not enough good data to clean %s. Aborting." % column
+            if empty_nan:
+                df[column] = np.nan
+            continue
+        cleaned = np.interp(pos, goodinds, data[goodinds, k])
+        cleaned[:goodinds[0]] = np.nan
+        df[column] = cleaned
+    return df
 
-    newdat = pd.Series(data)
-    newdat[allbad] = np.nan
 
-    goodinds = np.nonzero(np.invert(np.isnan(newdat)))[0]
-    if len(goodinds) == 0:
-        print "Not enough good data to clean. Aborting."
+def cleanseries(data, **kwargs):  # cleans one pupil Series, see clean_pupils
+    should_clean = ('LeftPupil', 'RightPupil')
+    if data.name not in should_clean:
         return data
-    else:
-        return pd.Series.interpolate(newdat, method='linear')
+    return clean_pupils(data.to_frame(), **kwargs)[data.name]
 
 
 def convert_tuples(df):
@@ -119,6 +144,186 @@ def string_to_tuple(string):
     return tuple(temp)
 
 
+# tuple columns written by TobiiController.flushData and their coordinates
+TUPLE_COLUMNS = [('LeftEyePosition3D', 'xyz'),
+                 ('LeftEyePosition3DRelative', 'xyz'),
+                 ('LeftGazePoint3D', 'xyz'),
+                 ('LeftGazePoint2D', 'xy'),
+                 ('RightEyePosition3D', 'xyz'),
+                 ('RightEyePosition3DRelative', 'xyz'),
+                 ('RightGazePoint3D', 'xyz'),
+                 ('RightGazePoint2D', 'xy')]
+
+
+def sample_dtype():
+    """
+    dtype of the samples array in binary session files, matching
+    samplestore.SAMPLE_DTYPE in pytask: tuple columns are split into one
+    column per coordinate, named e.g. LeftEyePosition3D_x
+    """
+    fields = [('Timestamp', 'f8')]
+    for eye in ('Left', 'Right'):
+        for column, coords in TUPLE_COLUMNS:
+            if column.startswith(eye):
+                fields += [(column + '_' + c, 'f8') for c in coords]
+        fields += [(eye + 'Pupil', 'f8'), (eye + 'Validity', 'i4')]
+    return np.dtype(fields)
+
+
+def read_npz(path, mmap_mode='r'):
+    """
+    read the arrays of an uncompressed .npz file into a dict. with mmap_mode
+    set, each array is memory-mapped from its place inside the zip archive
+    instead of being read into memory (arrays that were pickled or
+    compressed are always read normally)
+    """
+    if mmap_mode is None:
+        with np.load(path, allow_pickle=True) as npz:
+            return dict((name, npz[name]) for name in npz.files)
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-4]  # strip .npy
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = None
+                continue
+            # skip the local file header to get to the .npy data
+            f.seek(info.header_offset)
+            header = struct.unpack('<4s5H3L2H', f.read(30))
+            f.seek(header[-2] + header[-1], 1)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                arrays[name] = None
+            elif len(shape) == 0 or 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode,
+                                         offset=f.tell(), shape=shape,
+                                         order='F' if fortran else 'C')
+    if any(a is None for a in arrays.values()):
+        with np.load(path, allow_pickle=True) as npz:
+            for name in arrays:
+                if arrays[name] is None:
+                    arrays[name] = npz[name]
+    return arrays
+
+
+def load_session(path, mmap_mode='r'):
+    """
+    load a binary session file into a frame laid out like a TSV read with
+    pd.DataFrame.from_csv: indexed by Timestamp, with event/param lists as
+    columns aligned to the first rows. tuple columns stay split per
+    coordinate. the result can be passed to prepdata
+    """
+    arrays = read_npz(path, mmap_mode)
+    samples = arrays['samples']
+    nsamples = samples.size
+    df = pd.DataFrame(dict((name, samples[name]) for name in samples.dtype.names),
+                      columns=samples.dtype.names)
+    for event in arrays['events']:
+        values = arrays['event_' + event][:nsamples]
+        df[event] = pd.Series(values, index=np.arange(values.size))
+    return df.set_index('Timestamp')
+
+
+def tsv_to_npz(tsv_path, npz_path=None):
+    """
+    convert a data file written by flushData into the binary session format
+    saved by TobiiController.saveBinary. returns the path of the .npz file.
+    sample columns missing from older layouts are filled with nan (validity
+    with -1); every other column is stored as an event/param array
+    """
+    if npz_path is None:
+        npz_path = os.path.splitext(tsv_path)[0] + '.npz'
+    df = read_tsv(tsv_path).reset_index()
+
+    dtype = sample_dtype()
+    samples = np.zeros(len(df), dtype=dtype)
+    for name in dtype.names:
+        if name in df:
+            samples[name] = df[name].values
+        elif name.endswith('Validity'):
+            samples[name] = -1
+        else:
+            samples[name] = np.nan
+
+    events = [column for column in df.columns if column not in dtype.names]
+    arrays = {'samples': samples, 'events': np.array(events, dtype=str)}
+    for event in events:
+        values = df[event].dropna().values
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays['event_' + event] = values
+    np.savez(npz_path, **arrays)
+    return npz_path
+
+
+def expand_tuples(df):
+    """
+    replace each tuple column (after convert_tuples) with one numeric column
+    per coordinate, named e.g. LeftEyePosition3D_x
+    """
+    for column, coords in TUPLE_COLUMNS:
+        if column in df:
+            xyz = np.array(df[column].tolist(), dtype=float)
+            loc = df.columns.get_loc(column)
+            del df[column]
+            for i, c in enumerate(coords):
+                df.insert(loc + i, column + '_' + c, xyz[:, i])
+    return df
+
+
+def read_tsv(path):
+    """
+    fast replacement for pd.DataFrame.from_csv(path, sep='\\t') followed by
+    convert_tuples. instead of parsing tuple cells like (x, y, z) one at a
+    time, the parentheses are stripped from the raw text and the commas
+    turned into tabs, so the C parser reads every coordinate straight into
+    its own numeric column (named as in expand_tuples). returns a frame
+    indexed by Timestamp that can be passed to prepdata. falls back to the
+    slow path if tuple-like text turns up outside the tuple columns
+    """
+    with open(path) as f:
+        header = f.readline().rstrip('\r\n').split('\t')
+        body = f.read()
+    coords = dict(TUPLE_COLUMNS)
+    tuples = [column for column in header if column in coords]
+
+    if tuples:
+        nrows = body.count('\n')
+        if body and not body.endswith('\n'):
+            nrows += 1
+        nsep = sum(len(coords[column]) - 1 for column in tuples)
+        # only rewrite the text if every ( and , belongs to a tuple column
+        if (body.count('(') != nrows * len(tuples) or
+                body.count(',') != nrows * nsep):
+            df = pd.read_csv(path, sep='\t')
+            df = expand_tuples(convert_tuples(df))
+            return df.set_index(header[0])
+        body = body.translate(None, '()').replace(', ', '\t')
+
+    names = []
+    for column in header:
+        if column in coords:
+            names += [column + '_' + c for c in coords[column]]
+        else:
+            names.append(column)
+    df = pd.read_csv(StringIO(body), sep='\t', header=None, names=names,
+                     float_precision='high')
+    return df.set_index(header[0])
+
+
+def read_session(path):  # loads a .npz session file or a .tsv data file
+    if path.endswith('.npz'):
+        return load_session(path)
+    return read_tsv(path)
+
+
 # convert a column in timestamps to seconds
 def timestamp_to_seconds(df, convert_column_name, new_column_name):
     df[new_column_name] = (
@@ -126,10 +331,138 @@ def timestamp_to_seconds(df, convert_column_name, new_column_name):
     return df
 
 
-def prepdata(df):  # sets up and formats df read from .tsv to be analyzed
+# moves event times (tracker us) to when the stimulus was actually presented,
+# adding the offset (ms) saved with each, e.g. soundoffset for soundtime.
+# files saved before offsets were recorded are left as they are
+def shift_by_latency(df, event_column_name, latency_column_name):
+    if latency_column_name in df:
+        df[event_column_name] = (df[event_column_name] +
+                                 1000 * df[latency_column_name])
+    return df
+
+
+def events_path(path):  # sparse events file saved next to a data file
+    return os.path.splitext(path)[0] + '.events.tsv'
+
+
+def read_events(path, attach=None):
+    """
+    the events of the data file at path as (events, params). events has a
+    row per recorded event, in time order, with its Timestamp (tracker us),
+    its name in event, and a column per value recorded with it (e.g. correct
+    with soundtime). params maps each param set for the whole session (task,
+    trialvec, ...) to its value, or list of values.
+
+    read from the .events.tsv next to the data file. files saved without one
+    only have the dense event columns, from which the columns ending in time
+    become events; attach names the event each of the other columns was
+    recorded with (e.g. {'correct': 'soundtime'}), by order, and the rest
+    become params
+    """
+    if os.path.isfile(events_path(path)):
+        table = pd.read_csv(events_path(path), sep='\t',
+                            float_precision='high')
+        session = table['Timestamp'].isnull()
+        params = {}
+        for name, rows in table[session].groupby('event', sort=False):
+            params[name] = list(pd.to_numeric(rows['value'], errors='ignore'))
+        events = table[~session].drop('value', axis=1)
+    else:
+        gaze = set(['Timestamp', 'LeftPupil', 'LeftValidity', 'RightPupil',
+                    'RightValidity'] + [name for name, _ in TUPLE_COLUMNS])
+        table = pd.read_csv(path, sep='\t', usecols=lambda c: c not in gaze,
+                            float_precision='high')
+        columns = dict((name, table[name].dropna()) for name in table)
+        attach = attach or {}
+        timed = [name for name in table if name.endswith('time')]
+        events = []
+        params = {}
+        for name in timed:
+            rows = pd.DataFrame({'Timestamp': columns[name].values,
+                                 'event': name})
+            for param, event in attach.items():
+                if event == name and param in columns:
+                    rows[param] = columns[param].values[:len(rows)]
+            events.append(rows)
+        for name in table:
+            if name not in timed and name not in attach:
+                params[name] = list(columns[name])
+        if len(events) == 0:  # e.g. the pst, which records no events
+            events = pd.DataFrame({'Timestamp': np.zeros(0, np.int64),
+                                   'event': np.zeros(0, object)},
+                                  columns=['Timestamp', 'event'])
+        else:
+            events = pd.concat(events, ignore_index=True, sort=False)
+    for name, values in params.items():
+        if len(values) == 1:
+            params[name] = values[0]
+    events = events.sort_values('Timestamp', kind='mergesort')
+    events['Timestamp'] = events['Timestamp'].astype(np.int64)
+    return events.reset_index(drop=True), params
+
+
+def join_events(df, events):
+    """
+    copy of events with the row of df (e.g. from prepdata) of the last sample
+    at or before each event in sample, and its time in Seconds from the
+    first sample as in timestamp_to_seconds. df must be sorted by Timestamp
+    """
+    events = events.copy()
+    timestamps = df['Timestamp'].values
+    rows = np.searchsorted(timestamps, events['Timestamp'].values,
+                           side='right') - 1
+    events['sample'] = np.clip(rows, 0, len(timestamps) - 1)
+    events['Seconds'] = (events['Timestamp'] - timestamps[0]) / 1000000.0
+    return events
+
+
+def event_columns(events, params):
+    """
+    the events and params from read_events as the lists of values of dense
+    event columns: each event's Timestamps and each value recorded with an
+    event, in the order they were recorded, and each param's value(s)
+    """
+    columns = {}
+    for name, rows in events.groupby('event', sort=False):
+        columns[name] = list(rows['Timestamp'])
+    for name in events.columns.drop(['Timestamp', 'event']):
+        if name not in ('sample', 'Seconds'):  # added by join_events
+            columns[name] = list(events[name].dropna())
+    for name, value in params.items():
+        columns[name] = value if isinstance(value, list) else [value]
+    return columns
+
+
+def add_event_columns(df, path):
+    """
+    df (e.g. from prepdata) with the event and param columns it lacks read
+    from the events file next to the data file at path and laid out as in a
+    data file saved with dense event columns, one value per row from the
+    first row. for code that reads those columns (batch.py) on data files
+    saved without them; other files are returned as they are
+    """
+    if not os.path.isfile(events_path(path)):
+        return df
+    missing = [(name, values) for name, values in
+               event_columns(*read_events(path)).items() if name not in df]
+    if len(missing) == 0:
+        return df
+    df = df.copy()
+    for name, values in missing:
+        if len(values) > len(df):
+            print ('%d values of %s come after the last sample; they are'
+                   ' left out' % (len(values) - len(df), name))
+        values = values[:len(df)]
+        df[name] = pd.Series(values, index=df.index[:len(values)])
+    return df
+
+
+# sets up and formats df read from .tsv to be analyzed. keyword arguments are
+# passed on to clean_pupils
+def prepdata(df, **clean_args):
     df = df.reset_index()  # change timestamp into a column and index from 0
     df = convert_tuples(df)  # convert tuple strings to actual tuples
-    df = df.apply(cleanseries)  # clean data
+    df = clean_pupils(df, **clean_args)  # clean data
     # Add Seconds column
     df = timestamp_to_seconds(df, 'Timestamp', 'Seconds')
     df = df.set_index('Seconds', drop=True)  # set index to Seconds
@@ -139,15 +472,93 @@ def prepdata(df):  # sets up and formats df read from .tsv to be analyzed
     return df
 
 
-def basenorm(chunklist, idx, t_int, flag):
+BASELINE_MODES = ('subtract', 'divide', 'zscore')
+
+
+def baseline_correct(data, times, t_int, mode='subtract', groups=None):
+    """
+    normalize epochs (events x time, or events x time x channels) by their
+    mean over the baseline interval [t_int[0], t_int[1]) of times, in one
+    broadcast operation. mode is 'subtract', 'divide' or 'zscore' (subtract
+    the baseline mean, then divide by the baseline standard deviation).
+    nans are ignored. by default each trial has its own baseline; if groups
+    gives a condition label per event, all trials of a condition share the
+    baseline pooled over their baseline samples
+    """
     if not t_int[1] > t_int[0]:
         print 'Normalizing epoch endpoint must be after start point.'
         return None
+    if mode not in BASELINE_MODES:
+        print 'Baseline mode must be one of %s.' % (BASELINE_MODES,)
+        return None
 
-    norm_chunks = list()
+    data = np.asarray(data, dtype=float)
+    times = np.asarray(times)
+    sel = np.logical_and(times >= t_int[0], times < t_int[1])
+    base = data[:, sel]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if groups is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # empty mean
+                mean = np.nanmean(base, axis=1)
+                if mode == 'zscore':
+                    std = np.nanstd(base, axis=1)
+        else:
+            # sums over each condition's trials as one matrix product
+            labels, which = np.unique(np.asarray(groups), return_inverse=True)
+            member = (which == np.arange(len(labels))[:, np.newaxis]) * 1.0
+            count = member.dot((~np.isnan(base)).sum(axis=1))
+            total = member.dot(np.nansum(base, axis=1))
+            mean = (total / count)[which]
+            if mode == 'zscore':
+                squares = member.dot(np.nansum(base ** 2, axis=1))
+                std = np.sqrt(squares / count - (total / count) ** 2)[which]
+
+        mean = np.expand_dims(mean, 1)
+        if mode == 'subtract':
+            return data - mean
+        elif mode == 'divide':
+            return data / mean
+        else:
+            return (data - mean) / np.expand_dims(std, 1)
+
+
+# flag 0 is subtractive, 1 divisive and 2 z-scored normalization (see
+# baseline_correct); other flags give empty chunks, as they always have.
+# chunks with numeric data are normalized together when they share their
+# time axis and shape, as the chunks from evtsplit do, and one by one if not
+def basenorm(chunklist, idx, t_int, flag):
+    if not t_int[1] > t_int[0]:
+        print 'Normalizing epoch endpoint must be after start point.'
+        return None
 
-    # normalizes each chunk
-    for df in chunklist:
+    norm_chunks = [None] * len(chunklist)
+
+    numeric = []
+    if flag in range(len(BASELINE_MODES)):
+        numeric = [i for i, df in enumerate(chunklist)
+                   if all(dtype.kind in 'biuf' for dtype in df.dtypes)]
+    first = chunklist[numeric[0]] if numeric else None
+    if numeric and all(chunklist[i].shape == first.shape and
+                       chunklist[i].index.equals(first.index)
+                       for i in numeric):
+        groups = [numeric]
+    else:
+        groups = [[i] for i in numeric]
+    for group in groups:
+        data = np.dstack([chunklist[i].values.T for i in group])
+        norm_data = baseline_correct(data, chunklist[group[0]].index, t_int,
+                                     BASELINE_MODES[flag])
+        for k, i in enumerate(group):
+            norm_chunks[i] = pd.DataFrame(norm_data[:, :, k].T,
+                                          index=chunklist[i].index,
+                                          columns=list(chunklist[i].columns))
+
+    # anything else (e.g. strings) is normalized column by column
+    for i, df in enumerate(chunklist):
+        if norm_chunks[i] is not None:
+            continue
         t_axis = df.index
         sel = np.logical_and(t_axis >= t_int[0], t_axis < t_int[1])
         base = df[sel]
@@ -160,7 +571,7 @@ def basenorm(chunklist, idx, t_int, flag):
         elif flag == 1:
             for column in baseline.index:
                 norm_data[column] = df[column] / baseline[column]
-        norm_chunks.append(norm_data)
+        norm_chunks[i] = norm_data
 
     return norm_chunks
 
@@ -175,11 +586,15 @@ def find_closest(a, target):
     return idx
 
 
-def splitseries(ser, ts, t_pre, t_post, t0=0.0):
-    xx = ser.values.squeeze()  # convert to 1d numpy array
-    tt = ser.index
-    nevt = ts.dropna().size
-
+def epoch_windows(tt, events, t_pre, t_post, t0=0.0):
+    """
+    start index in tt of the window around each event, and the time axis
+    shared by all windows. every window is snapped to the sample closest to
+    t_pre + event (one searchsorted for all events) and runs for as many
+    samples as the time axis, which is read off tt around 0. events stop at
+    the first nan
+    """
+    tt = pd.Index(tt)
     if t_pre < 0:
         negstart = find_closest(tt, -t_pre)
         nend = find_closest(tt, t_post)
@@ -192,22 +607,77 @@ def splitseries(ser, ts, t_pre, t_post, t0=0.0):
         nslice = slice(nstart, nend)
         bin_t = tt[nslice]
 
-    evtrel = ts - t0
+    evt = np.asarray(events, dtype=float)
+    isnan = np.nonzero(np.isnan(evt))[0]
+    if len(isnan) > 0:
+        evt = evt[:isnan[0]]
+    starts = find_closest(tt.values, t_pre + (evt - t0))
+    return starts, bin_t, evt
+
 
-    elist = []
-    for time in evtrel:
-        if math.isnan(time):
-            break
-        start_index = find_closest(tt, t_pre + time)
-        end_index = find_closest(tt, t_post + time)
-        diff = (end_index - start_index) - len(bin_t)
-        ss = slice(start_index, end_index - diff)
-        elist.append(pd.DataFrame(xx[ss], columns=[time]))
-    alltrials = pd.concat(elist, axis=1)
-    alltrials = alltrials.set_index(bin_t)
-    alltrials.index.name = 'time'
-    alltrials.columns = pd.Index(np.arange(nevt), name='trial')
-    return alltrials
+def gather(values, starts, nbins):
+    """
+    take nbins rows of values (samples x channels) from each start index in
+    one fancy-indexing step, giving an (events, time, channels) array.
+    windows running past the end of values are padded with nan
+    """
+    idx = starts[:, np.newaxis] + np.arange(nbins)
+    inside = idx < len(values)
+    out = values[np.minimum(idx, len(values) - 1)]
+    if not inside.all():
+        if out.dtype.kind in 'biu':
+            out = out.astype(float)
+        out[~inside] = np.nan
+    return out
+
+
+class Epochs(object):
+    """
+    dense epochs around a list of events. data has shape (events, time,
+    channels), times is the time axis relative to each event, columns the
+    channel names and events the event times
+    """
+
+    def __init__(self, data, times, columns, events):
+        self.data = data
+        self.times = times
+        self.columns = pd.Index(columns)
+        self.events = events
+
+    def __getitem__(self, column):  # (events, time) array for one channel
+        return self.data[:, :, self.columns.get_loc(column)]
+
+    def frame(self, column):
+        """
+        time x trial frame for one channel, as returned by splitseries
+        """
+        alltrials = pd.DataFrame(self[column].T, index=self.times,
+                                 columns=pd.Index(np.arange(len(self.events)),
+                                                  name='trial'))
+        alltrials.index.name = 'time'
+        return alltrials
+
+    def frames(self):  # one frame per channel, as returned by evtsplit
+        return [self.frame(column) for column in self.columns]
+
+
+def epochs(df, events, t_pre, t_post, t0=0.0, columns=None):
+    """
+    cut (t_pre, t_post) windows around each event out of the columns of df
+    (all numeric columns by default) into an Epochs object. t_pre should be
+    < 0 for times before the event. windows match those of splitseries
+    """
+    if columns is None:
+        columns = [column for column in df.columns
+                   if df[column].dtype.kind in 'biuf']
+    starts, bin_t, evt = epoch_windows(df.index, events, t_pre, t_post, t0)
+    data = gather(df[columns].values, starts, len(bin_t))
+    return Epochs(data, bin_t, columns, evt)
+
+
+def splitseries(ser, ts, t_pre, t_post, t0=0.0):
+    name = 0 if ser.name is None else ser.name
+    return epochs(ser.to_frame(name), ts, t_pre, t_post, t0, [name]).frame(name)
 
 
 def evtsplit(df, events, t_pre, t_post, t0=0.0):
@@ -218,9 +688,16 @@ def evtsplit(df, events, t_pre, t_post, t0=0.0):
     if return_by_event is True, return a list of dataframes, one per event
     """
 
-    chunklist = []
-    for col in df.columns.values:
-        chunklist.append(splitseries(df[col], events, t_pre, t_post, t0))
+    # columns of the same dtype are cut out together, keeping their dtype
+    starts, bin_t, evt = epoch_windows(df.index, events, t_pre, t_post, t0)
+    chunks = {}
+    for dtype, columns in df.columns.to_series().groupby(df.dtypes):
+        columns = list(columns)
+        data = gather(df[columns].values, starts, len(bin_t))
+        split = Epochs(data, bin_t, columns, evt)
+        for column in columns:
+            chunks[column] = split.frame(column)
+    chunklist = [chunks[column] for column in df.columns]
     idx = df.columns
 
     return chunklist, idx
@@ -238,6 +715,6 @@ if __name__ == "__main__":
 
     datafile_path = '/Users/shariqiqbal/data/test/PST/09_07_58on06-30-2015.tsv'
 
-    df = pd.DataFrame.from_csv(datafile_path, sep='\t')
+    df = read_tsv(datafile_path)
 
     df = prepdata(df)
@@ -5,8 +5,15 @@ import json
 import time
 import datetime
 TESTING = 0
+STREAMING = 1  # write gaze data to disk while tracking
+BINARY = 1  # also save each session as a typed .npz file
+DENSE_EVENTS = 1  # also write event columns next to the gaze data
+SIMULATE = 0  # record from a simulated tracker instead (see simtracker.py)
 if not TESTING:
-    import TobiiControllerP
+    if SIMULATE:
+        import simtracker
+    else:
+        import TobiiControllerP
 import lightdarktest
 import oddball
 import revlearn
@@ -15,12 +22,14 @@ import display
 import draweyes
 import pst
 import imagetest
+import soundmanager
 
 
 class TaskController:
 
     def __init__(self, working_path):
         self.testing = TESTING
+        self.simulate = SIMULATE
         self.path = working_path
         self.settings_path = os.path.join(self.path, 'settings')
         self.settings_file = os.path.join(self.settings_path, 'settings.json')
@@ -32,6 +41,8 @@ class TaskController:
                 self.settings = json.load(settings)
         self.data_path = os.path.join(self.path, 'data')
         self.testWin, self.experWin = display.getWindows(self)
+        self.sounds = soundmanager.SoundManager(output_latency=self.settings.get(
+            'Sound: Output Latency (ms)', 0) / 1000.0)
         self.actions = [  # actions that can be executed
             '0) Draw Eyes',
             '1) Calibrate',
@@ -55,8 +66,15 @@ class TaskController:
         self.subject = '0'
         # CONNECT TO EYE TRACKER
         if not self.testing:
-            self.tobii_cont = TobiiControllerP.TobiiController(
-                self.testWin, self.experWin)
+            if self.simulate:
+                self.tobii_cont = simtracker.SimulatedController(
+                    self.testWin, self.experWin)
+            else:
+                self.tobii_cont = TobiiControllerP.TobiiController(
+                    self.testWin, self.experWin)
+            self.tobii_cont.streaming = STREAMING
+            self.tobii_cont.binary = BINARY
+            self.tobii_cont.denseEvents = DENSE_EVENTS
             self.tobii_cont.waitForFindEyeTracker()
             self.tobii_cont.activate(self.tobii_cont.eyetrackers.keys()[0])
             self.calib_complete = False
@@ -71,6 +89,8 @@ class TaskController:
         data_filepath = os.path.join(
             self.data_path, str(self.subject))
         if action == 'q':
+            display.timing_report()
+            self.sounds.report()
             self.testWin.close()
             self.experWin.close()
             if not self.testing:
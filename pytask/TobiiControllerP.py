@@ -41,18 +41,17 @@ import psychopy.event
 import Image
 import ImageDraw
 
+import recorder
 
-class TobiiController:
+
+class TobiiController(recorder.Recorder):
 
     def __init__(self, testWin, experWin):
         self.eyetracker = None
         self.eyetrackers = {}
         self.testWin = testWin
         self.experWin = experWin
-        self.gazeData = []
-        self.events = []
-        self.eventData = {}
-        self.datafile = None
+        recorder.Recorder.__init__(self)
 
         tobii.eye_tracking_io.init()
         self.clock = tobii.eye_tracking_io.time.clock.Clock()
@@ -313,140 +312,19 @@ class TobiiController:
     ##########################################################################
     # tracking methods
     ##########################################################################
-    def startTracking(self):
-        self.gazeData = []
-        self.eventData = {}
-        self.events = []
+    def startSource(self):
         self.eyetracker.events.OnGazeDataReceived += self.on_gazedata
         self.eyetracker.StartTracking()
 
-    def stopTracking(self):
+    def stopSource(self):
         self.eyetracker.StopTracking()
         self.eyetracker.events.OnGazeDataReceived -= self.on_gazedata
-        self.flushData()
-        self.gazeData = []
-        self.eventData = {}
-        self.events = []
-
-    def on_gazedata(self, error, gaze):
-        self.gazeData.append(gaze)
-
-    # modified to return relative coordinates rather than pixel coordinates
-    def getGazePosition(self, gaze):
-        return ((gaze.LeftGazePoint2D.x - 0.5) * 2,
-                (0.5 - gaze.LeftGazePoint2D.y) * 2,
-                (gaze.RightGazePoint2D.x - 0.5) * 2,
-                (0.5 - gaze.RightGazePoint2D.y) * 2)
-
-    def getCurrentGazePosition(self):
-        if len(self.gazeData) == 0:
-            return (None, None, None, None)
-        else:
-            return self.getGazePosition(self.gazeData[-1])
-
-    def getCurrentPupilsandValidity(self):  # added
-        if len(self.gazeData) == 0:
-            return(None, None, None, None)
-        else:
-            return self.getPupilsandValidity(self.gazeData[-1])
-
-    def getPupilsandValidity(self, gaze):  # added
-        return (gaze.LeftPupil, gaze.LeftValidity, gaze.RightPupil, gaze.RightValidity)
-
-    # altered to take open file instead of filename. got rid of header which
-    # makes the file incompatible with matlab
-    def setDataFile(self, openfile):
-        self.datafile = openfile
-
-    # altered to simply flush data, but not close file
-    def closeDataFile(self):
-        if self.datafile != None:
-            self.flushData()
-
-        self.datafile = None
 
-    def recordEvent(self, event):  # records timestamp for an event
-        t = self.syncmanager.convert_from_local_to_remote(
-            self.clock.get_time())
-        self.eventData[event].append(t)
-
-    def addParam(self, param, value):  # appends value to param list
-        self.eventData[param].append(value)
-
-    def setParam(self, param, value):  # sets value for param
-        self.eventData[param] = [value]
-
-    def setVector(self, param, vector):  # sets a vector in a column
-        self.eventData[param] = vector
-
-    # creates columns for events and params
-    def setEventsAndParams(self, events):
-        self.events = events
-        for event in events:
-            self.eventData[event] = []
-
-    # altered to create data file that is easily imported into matlab
-    def flushData(self):
-        if self.datafile == None:
-            print 'data file is not set.'
-            return
-
-        if len(self.gazeData) == 0:
-            return
+    def getLocalTime(self):
+        return self.clock.get_time()
 
-        self.datafile.write('\t'.join(['Timestamp',
-                                       'LeftEyePosition3D',  # left eye
-                                       'LeftEyePosition3DRelative',
-                                       'LeftGazePoint3D',
-                                       'LeftGazePoint2D',
-                                       'LeftPupil',
-                                       'LeftValidity',
-                                       'RightEyePosition3D',  # right eye
-                                       'RightEyePosition3DRelative',
-                                       'RightGazePoint3D',
-                                       'RightGazePoint2D',
-                                       'RightPupil',
-                                       'RightValidity']))
-        self.datafile.write('\t')
-        self.datafile.write('\t'.join(self.events))
-
-        self.datafile.write('\n')
-        i = 0
-        for g in self.gazeData:
-            self.datafile.write('%.1f\t%s\t%s\t%s\t%s\t%.2f\t%d\t%s\t%s\t%s\t%s\t%.2f\t%d' % (
-                                g.Timestamp,
-                                g.LeftEyePosition3D if g.LeftValidity != 4 else (
-                                    -1.0, -1.0, -1.0),
-                                g.LeftEyePosition3DRelative if g.LeftValidity != 4 else (
-                                    -1.0, -1.0, -1.0),
-                                g.LeftGazePoint3D if g.LeftValidity != 4 else (
-                                    -1.0, -1.0, -1.0),
-                                g.LeftGazePoint2D if g.LeftValidity != 4 else (
-                                    -1.0, -1.0),
-                                g.LeftPupil if g.LeftValidity != 4 else -1.0,
-                                g.LeftValidity,
-                                g.RightEyePosition3D if g.RightValidity != 4 else (
-                                    -1.0, -1.0, -1.0),
-                                g.RightEyePosition3DRelative if g.RightValidity != 4 else (
-                                    -1.0, -1.0, -1.0),
-                                g.RightGazePoint3D if g.RightValidity != 4 else (
-                                    -1.0, -1.0, -1.0),
-                                g.RightGazePoint2D if g.RightValidity != 4 else (
-                                    -1.0, -1.0),
-                                g.RightPupil if g.RightValidity != 4 else -1.0,
-                                g.RightValidity))
-
-            for event in self.events:
-                thisData = self.eventData[event]
-                if i < len(thisData):
-                    self.datafile.write('\t' + str(thisData[i]))
-                else:
-                    self.datafile.write('\t')
-
-            self.datafile.write('\n')
-            i += 1
-
-        self.datafile.flush()
+    def localToTracker(self, t):  # with the SyncManager's current estimate
+        return self.syncmanager.convert_from_local_to_remote(t)
 
 ############################################################################
 # run following codes if this file is executed directly
@@ -0,0 +1,137 @@
+'''
+Timing of the save at the end of a task (TobiiController.flushData) for a
+simulated session, without a tracker or PsychoPy: the chunked array path
+against the original loop over the SDK's gaze objects.
+
+usage: python bench.py [seconds] [rate]   (default: a 120 s PST at 300 Hz)
+'''
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import samplestore
+
+
+def simulate(seconds, rate, seed=0):  # store of random samples, 1/4 invalid
+    n = int(seconds * rate)
+    rs = np.random.RandomState(seed)
+    data = np.zeros(n, dtype=samplestore.SAMPLE_DTYPE)
+    for name in samplestore.SAMPLE_DTYPE.names:
+        data[name] = rs.uniform(0, 1, n)
+    data['Timestamp'] = 1435667852433075 + np.arange(n) * (1e6 / rate)
+    for eye in ('Left', 'Right'):
+        data[eye + 'Pupil'] = rs.uniform(2, 5, n)
+        data[eye + 'Validity'] = rs.choice([0, 0, 0, samplestore.INVALID], n)
+    store = samplestore.SampleStore()
+    store.extend(data)
+    return store
+
+
+class Point:  # prints like the SDK's points: (x, y[, z])
+
+    def __init__(self, *coords):
+        self.coords = coords
+
+    def __str__(self):
+        return '(' + ', '.join(map(str, self.coords)) + ')'
+
+
+class GazeData:  # stand-in for the SDK gaze objects the tracker used to keep
+
+    def __init__(self, row):
+        self.Timestamp = row[samplestore.FIELDS['Timestamp']]
+        for eye in ('Left', 'Right'):
+            for point, coords in samplestore.POINTS:
+                name = eye + point
+                setattr(self, name, Point(*[
+                    row[samplestore.FIELDS[name + '_' + c]] for c in coords]))
+            setattr(self, eye + 'Pupil', row[samplestore.FIELDS[eye + 'Pupil']])
+            setattr(self, eye + 'Validity',
+                    row[samplestore.FIELDS[eye + 'Validity']])
+
+
+def gaze_objects(store):
+    return [GazeData(row) for row in store.array().tolist()]
+
+
+def flush_objects(outfile, gazeData, columns):
+    # the loop of flushData before samples were kept in an array: one
+    # formatted write per SDK object, then one write per event cell
+    i = 0
+    for g in gazeData:
+        outfile.write('%.1f\t%s\t%s\t%s\t%s\t%.2f\t%d\t%s\t%s\t%s\t%s\t%.2f\t%d' % (
+                      g.Timestamp,
+                      g.LeftEyePosition3D if g.LeftValidity != 4 else (
+                          -1.0, -1.0, -1.0),
+                      g.LeftEyePosition3DRelative if g.LeftValidity != 4 else (
+                          -1.0, -1.0, -1.0),
+                      g.LeftGazePoint3D if g.LeftValidity != 4 else (
+                          -1.0, -1.0, -1.0),
+                      g.LeftGazePoint2D if g.LeftValidity != 4 else (
+                          -1.0, -1.0),
+                      g.LeftPupil if g.LeftValidity != 4 else -1.0,
+                      g.LeftValidity,
+                      g.RightEyePosition3D if g.RightValidity != 4 else (
+                          -1.0, -1.0, -1.0),
+                      g.RightEyePosition3DRelative if g.RightValidity != 4 else (
+                          -1.0, -1.0, -1.0),
+                      g.RightGazePoint3D if g.RightValidity != 4 else (
+                          -1.0, -1.0, -1.0),
+                      g.RightGazePoint2D if g.RightValidity != 4 else (
+                          -1.0, -1.0),
+                      g.RightPupil if g.RightValidity != 4 else -1.0,
+                      g.RightValidity))
+        for thisData in columns:
+            if i < len(thisData):
+                outfile.write('\t' + str(thisData[i]))
+            else:
+                outfile.write('\t')
+        outfile.write('\n')
+        i += 1
+
+
+def flush_chunks(outfile, store, columns, chunk=4096):
+    data = store.array()
+    events = samplestore.join_columns(columns, len(data))
+    for i in xrange(0, len(data), chunk):
+        outfile.write(samplestore.format_rows(data[i:i + chunk],
+                                              events[i:i + chunk]))
+
+
+def timed(flush, path, store, columns):
+    start = time.time()
+    with open(path, 'w') as outfile:
+        flush(outfile, store, columns)
+    return time.time() - start
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 120
+    rate = float(argv[2]) if len(argv) > 2 else 300
+    store = simulate(seconds, rate)
+    columns = [['pst'], [seconds]]  # the task and duration params of a PST
+    gazeData = gaze_objects(store)
+    fd, old_path = tempfile.mkstemp(suffix='.tsv')
+    os.close(fd)
+    fd, new_path = tempfile.mkstemp(suffix='.tsv')
+    os.close(fd)
+    try:
+        old = min(timed(flush_objects, old_path, gazeData, columns)
+                  for i in range(3))
+        new = min(timed(flush_chunks, new_path, store, columns)
+                  for i in range(3))
+        with open(old_path, 'rb') as a, open(new_path, 'rb') as b:
+            same = a.read() == b.read()
+    finally:
+        os.remove(old_path)
+        os.remove(new_path)
+    print 'save stall for %d samples (%g s at %g Hz)' % (len(store), seconds,
+                                                         rate)
+    print 'SDK objects %8.3fs' % old
+    print 'chunked     %8.3fs  (%.1fx, output %s)' % (
+        new, old / new, 'identical' if same else 'DIFFERENT')
+    return 0 if same else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,88 @@
+'''
+Linear model between the local clock that events are timed with and the
+tracker's clock that gaze samples are timestamped with. Pairs of clock
+readings are sampled in the background during a recording, and the events
+are converted in bulk at the end, so timing an event only costs reading the
+local clock.
+
+tracker time = clock_offset + clock_rate * (local time - clock_ref)
+'''
+import threading
+
+import numpy as np
+
+# names of the model parameters as saved with the events
+PARAMS = ['clock_ref', 'clock_offset', 'clock_rate', 'clock_samples',
+          'clock_residual']
+
+
+class ClockModel:
+
+    def __init__(self):
+        self.local = []
+        self.remote = []
+        self.ref = 0
+        self.offset = 0
+        self.rate = 1.0
+        self.residual = 0.0
+
+    def __len__(self):
+        return len(self.local)
+
+    def add(self, local, remote):  # one pair of simultaneous clock readings
+        self.local.append(local)
+        self.remote.append(remote)
+
+    def fit(self):
+        """
+        least squares offset and rate (drift) of the tracker clock against
+        the local clock, around the first local reading. ref and offset are
+        rounded to whole microseconds so that saved values reproduce the
+        converted times exactly
+        """
+        if len(self.local) == 0:
+            raise ValueError('no clock readings to fit')
+        self.ref = int(self.local[0])
+        # fit the difference between the clocks, which is small, rather than
+        # tracker times of ~1e15 us that a float fit would round
+        x = np.array(self.local, dtype=np.int64) - self.ref
+        d = np.array(self.remote, dtype=np.int64) - self.ref - x
+        if len(x) > 1 and x.ptp() > 0:
+            drift, offset = np.polyfit(x.astype(float), d.astype(float), 1)
+        else:  # not enough spread to measure drift
+            drift, offset = 0.0, d.mean()
+        self.rate = 1 + drift
+        self.offset = self.ref + int(round(offset))
+        self.residual = np.abs(self.offset - self.ref + drift * x - d).max()
+
+    def convert(self, local):  # tracker times of local times, as ints
+        x = np.asarray(local, dtype=np.int64) - self.ref
+        return [self.offset + int(t) for t in np.round(self.rate * x)]
+
+    def params(self):  # parameter values in PARAMS order, ready to save
+        return [self.ref, self.offset, '%.15g' % self.rate, len(self.local),
+                '%.1f' % self.residual]
+
+
+class ClockSampler(threading.Thread):  # adds clock pairs to a ClockModel
+
+    # sample: function returning a (local, tracker) pair of clock readings
+    # interval: seconds between readings
+    def __init__(self, sample, model, interval=1.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sample = sample
+        self.model = model
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            self.model.add(*self.sample())
+            if self.stopped.wait(self.interval):
+                break
+
+    def close(self):  # stops the thread after one last reading
+        self.stopped.set()
+        self.join()
+        self.model.add(*self.sample())
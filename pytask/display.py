@@ -1,12 +1,26 @@
 '''
 Functions to display certain recurring instances throughout the different tests
 (e.g. countdowns, menu, etc.)
+
+Each stimulus is built once per window (see stimulus) and only has its text or
+color changed afterwards, since building a TextStim lays out and uploads its
+texture on the frame that is about to be timestamped. The time from each call
+to its flip is kept in timings.
+
+While tracking, wait keeps the quality of the gaze data (see quality.py) up
+to date on the experimenter's screen. wait_keys does not, so that a press is
+never held up behind a flip.
 '''
+import collections
+import numpy as np
 from psychopy import visual, core, event
+import quality
+
+MONITOR_INTERVAL = 0.5  # seconds between updates of the quality shown
 
 
 def getWindows(controller):
-    if controller.testing:
+    if controller.testing or controller.simulate:  # no tracker screen
         experWin = visual.Window(
             size=(640, 400), monitor="testMonitor", units="pix", pos=(0, 50))
         testWin = visual.Window(
@@ -16,54 +30,140 @@ def getWindows(controller):
             size=(1280, 1024), monitor="tobiiMonitor", units="pix", screen=1, fullscr = True)
         experWin = visual.Window(
             size=(640, 400), monitor="testMonitor", units="pix", screen=0)
+    prepare(testWin)
+    prepare(experWin)
     return testWin, experWin
 
 
+def text_stim(win, height, color, text='', pos=(0, 0)):
+    return visual.TextStim(win, text=text,
+                           font='Helvetica', alignHoriz='center', alignVert='center', units='norm',
+                           pos=pos, height=height, color=color, colorSpace='rgb255',
+                           wrapWidth=2)
+
+# builders of the stimuli used below, by name
+STIMULI = {
+    'countdown': lambda win: text_stim(win, 0.2, [178, 34, 34]),
+    'fill': lambda win: visual.Rect(win, 2, 2, units='norm', lineColor=None),
+    'text_keypress': lambda win: text_stim(win, 0.1, [255, 255, 255]),
+    'text': lambda win: text_stim(win, 0.2, [0, 255, 0]),
+    'cross': lambda win: text_stim(win, 0.3, [255, 255, 255], '+'),
+    'quality': lambda win: text_stim(win, 0.08, [255, 255, 255], pos=(0, -0.6))}
+
+stimuli = {}  # built stimuli, by (window, name)
+timings = collections.defaultdict(list)  # seconds from call to flip, by name
+
+
+def stimulus(win, name):  # the named stimulus of win, built on first use
+    key = (win, name)
+    if key not in stimuli:
+        stimuli[key] = STIMULI[name](win)
+    return stimuli[key]
+
+
+def prepare(win):  # builds every stimulus of win ahead of the tasks
+    for name in STIMULI:
+        stimulus(win, name)
+
+
+def set_text(stim, text):  # changing the text re-renders it, so only if needed
+    if stim.text != text:
+        stim.text = text
+
+
+def flip(win, name, start):  # flips win, keeping the time since start
+    win.flip()
+    timings[name].append(core.getTime() - start)
+
+
+def timing_report():
+    for name in sorted(timings):
+        ms = 1000 * np.array(timings[name])
+        print '%-14s %5d calls, call to flip %6.1f ms median, %6.1f ms 95th, %6.1f ms max' % (
+            name, len(ms), np.median(ms), np.percentile(ms, 95), ms.max())
+
+
 def countdown(controller):
     count_time = controller.settings['Countdown Time']  # countdown time in seconds
     win = controller.testWin
-    countdown_text = visual.TextStim(win, text=str(count_time),
-                                     font='Helvetica', alignHoriz='center', alignVert='center', units='norm',
-                                     pos=(0, 0), height=0.2, color=[178, 34, 34], colorSpace='rgb255',
-                                     wrapWidth=2)
+    countdown_text = stimulus(win, 'countdown')
     for i in range(count_time):
-        countdown_text.text = str(count_time)
+        start = core.getTime()
+        set_text(countdown_text, str(count_time))
         countdown_text.draw()
-        win.flip()
+        flip(win, 'countdown', start)
         core.wait(1.0)
         count_time -= 1
     win.flip(clearBuffer=True)  # clears countdown off of the screen
 
 
 def fill_screen(win, window_color):
+    start = core.getTime()
     # set rect to fill window with color
-    rect = visual.Rect(
-        win, 2, 2, units='norm', fillColor=window_color, lineColor=None)
+    rect = stimulus(win, 'fill')
+    rect.fillColor = window_color
     rect.draw()
-    win.flip()
+    flip(win, 'fill_screen', start)
 
 
 def text_keypress(win, text):
-    display_text = visual.TextStim(win, text=text,
-                                   font='Helvetica', alignHoriz='center', alignVert='center', units='norm',
-                                   pos=(0, 0), height=0.1, color=[255, 255, 255], colorSpace='rgb255',
-                                   wrapWidth=2)
+    start = core.getTime()
+    display_text = stimulus(win, 'text_keypress')
+    set_text(display_text, text)
     display_text.draw()
-    win.flip()
+    flip(win, 'text_keypress', start)
     event.waitKeys()
 
 def text(win, text):
-    display_text = visual.TextStim(win, text=text,
-                                   font='Helvetica', alignHoriz='center', alignVert='center', units='norm',
-                                   pos=(0, 0), height=0.2, color=[0, 255, 0], colorSpace='rgb255',
-                                   wrapWidth=2)
+    start = core.getTime()
+    display_text = stimulus(win, 'text')
+    set_text(display_text, text)
     display_text.draw()
-    win.flip()
+    flip(win, 'text', start)
 
 def cross(win):
-    cross = visual.TextStim(win, text='+',
-                            font='Helvetica', alignHoriz='center', alignVert='center', units='norm',
-                            pos=(0, 0), height=0.3, color=[255, 255, 255], colorSpace='rgb255',
-                            wrapWidth=2)
-    cross.draw()
+    start = core.getTime()
+    stimulus(win, 'cross').draw()
+    flip(win, 'cross', start)
+
+
+def show_quality(controller):
+    """
+    redraws the experimenter's screen with the last text() shown on it and
+    the quality of the recording. returns False if not tracking
+    """
+    if controller.testing:
+        return False
+    stats = controller.tobii_cont.getQuality()
+    if stats is None:
+        return False
+    win = controller.experWin
+    stimulus(win, 'text').draw()
+    quality_text = stimulus(win, 'quality')
+    set_text(quality_text, quality.describe(stats))
+    quality_text.draw()
     win.flip()
+    return True
+
+
+def wait(controller, seconds):
+    """
+    core.wait that updates the quality on the experimenter's screen. it is
+    only redrawn while more than two intervals are left, so that its flip
+    cannot make the wait run late
+    """
+    end = core.getTime() + seconds
+    while (end - core.getTime() > 2 * MONITOR_INTERVAL and
+           show_quality(controller)):
+        core.wait(MONITOR_INTERVAL)
+    core.wait(max(end - core.getTime(), 0))
+
+
+def wait_keys(controller, keyList=None):
+    """
+    event.waitKeys, without redrawing the quality: keys are only taken (and
+    timestamped) between flips, so a press during one would be seen late,
+    and the tasks record presstime when this returns. the quality shown is
+    from the last wait, e.g. the iti before
+    """
+    return event.waitKeys(keyList=keyList)
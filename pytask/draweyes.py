@@ -4,89 +4,80 @@ from psychopy import visual
 import math
 import time
 
+# outline color of an eye by its validity code (0 = sure it is that eye,
+# 4 = not found); higher codes use the last color
+VALIDITY_COLORS = [[-1, 1, -1], [-0.5, 0.5, -1], [0, 0, -1], [0.5, -0.5, -1],
+                   [1, -1, -1]]
+
+
+def validity_color(validity):
+    return VALIDITY_COLORS[min(max(validity, 0), len(VALIDITY_COLORS) - 1)]
+
+
+class EyeView:  # the circles and pupil text of one eye on both windows
+
+    def __init__(self, controller, label, text_x):
+        self.label = label
+        self.circles = [
+            visual.Circle(controller.experWin, radius=0.025, units='norm'),
+            visual.Circle(controller.testWin, radius=0.025, units='norm')]
+        self.text = visual.TextStim(controller.experWin, height=0.1,
+                                    pos=(text_x, -0.8), units='norm')
+        self.validity = None
+        self.pupil = None
+
+    def update(self, pupil, validity, x, y):
+        if validity != self.validity:  # colors only change with validity
+            for circle in self.circles:
+                circle.lineColor = validity_color(validity)
+            self.validity = validity
+        if validity < 4:
+            for circle in self.circles:
+                circle.pos = (x, y)
+            # text is slow to render, so only when the shown value changes
+            pupil = '%.2f' % pupil
+            if pupil != self.pupil:
+                self.text.setText(self.label + ' Pupil Diameter: ' + pupil)
+                self.pupil = pupil
+
+    def draw(self):
+        if self.validity < 4:
+            for circle in self.circles:
+                circle.draw()
+            self.text.draw()
+
 
 def show_eyes(controller):
-    running = True
     # start tracking
     controller.tobii_cont.startTracking()
 
     # set up figures to draw
-    left_eye = visual.Circle(controller.experWin, radius=0.025, units='norm')
-    right_eye = visual.Circle(controller.experWin, radius=0.025, units='norm')
-    left_eye_test = visual.Circle(controller.testWin, radius=0.025, units='norm')
-    right_eye_test = visual.Circle(controller.testWin, radius=0.025, units='norm')
-    left_text = visual.TextStim(controller.experWin, height=0.1, pos=(-0.6,-0.8), units='norm')
-    right_text = visual.TextStim(controller.experWin, height=0.1, pos=(0.6,-0.8), units='norm')
+    left = EyeView(controller, 'Left', -0.6)
+    right = EyeView(controller, 'Right', 0.6)
     press_text = visual.TextStim(controller.experWin, height=0.1, pos=(0,-0.3), text='Press any button to quit', units='norm')
+    frame = getattr(controller.experWin, 'monitorFramePeriod', 1 / 60.0)
 
-    # run while key is not pressed
-    while running:
-        pressed = event.getKeys()
-        if len(pressed) > 0:
-            running = False  # stops running if a key is pressed
-
-        # get pupil and validity information from Tobii
-        curr_pupil = controller.tobii_cont.getCurrentPupilsandValidity()
-        if curr_pupil == (None, None, None, None):
-            continue
-        left_pupil, left_validity, right_pupil, right_validity = curr_pupil
-
-        # get gaze direction information from Tobii
-        curr_gaze = controller.tobii_cont.getCurrentGazePosition()
-        if curr_gaze == (None, None, None, None):
+    # redraw when a new sample arrives, at most once per refresh as flip
+    # waits for it; between samples the loop sleeps instead of polling
+    seen = 0
+    while len(event.getKeys()) == 0:  # stops running if a key is pressed
+        received = controller.tobii_cont.waitForSample(seen, frame)
+        if received == seen:  # nothing new within a frame, check keys again
             continue
-        left_x, left_y, right_x, right_y = curr_gaze
-
-        # set colors based on validities
-        if left_validity == 0:
-            left_eye.lineColor = [-1, 1, -1]
-            left_eye_test.lineColor = [-1, 1, -1]
-        elif left_validity == 1:
-            left_eye.lineColor = [-0.5, 0.5, -1]
-            left_eye_test.lineColor = [-0.5, 0.5, -1]
-        elif left_validity == 2:
-            left_eye.lineColor = [0, 0, -1]
-            left_eye_test.lineColor = [0, 0, -1]
-        elif left_validity == 3:
-            left_eye.lineColor = [0.5, -0.5, -1]
-            left_eye_test.lineColor = [0.5, -0.5, -1]
-        else:
-            left_eye.lineColor = [1, -1, -1]
-            left_eye_test.lineColor = [1, -1, -1]
-
-        if right_validity == 0:
-            right_eye.lineColor = [-1, 1, -1]
-            right_eye_test.lineColor = [-1, 1, -1]
-        elif right_validity == 1:
-            right_eye.lineColor = [-0.5, 0.5, -1]
-            right_eye_test.lineColor = [-0.5, 0.5, -1]
-        elif right_validity == 2:
-            right_eye.lineColor = [0, 0, -1]
-            right_eye_test.lineColor = [0, 0, -1]
-        elif right_validity == 3:
-            right_eye.lineColor = [0.5, -0.5, -1]
-            right_eye_test.lineColor = [0.5, -0.5, -1]
-        else:
-            right_eye.lineColor = [1, -1, -1]
-            right_eye_test.lineColor = [1, -1, -1]
-
-        # draw appropriate figures to visualize gaze on experimenter's screen
-        if left_validity < 4:
-            left_eye.pos = (left_x, left_y)
-            left_eye_test.pos = (left_x, left_y)
-            left_text.setText('Left Pupil Diameter: ' + str(left_pupil))
-            left_eye.draw()
-            left_eye_test.draw()
-            left_text.draw()
+        seen = received
 
-        if right_validity < 4:
-            right_eye.pos = (right_x, right_y)
-            right_eye_test.pos = (right_x, right_y)
-            right_text.setText('Right Pupil Diameter: ' + str(right_pupil))
-            right_eye.draw()
-            right_eye_test.draw()
-            right_text.draw()
+        # pupils, validities and gaze all from the newest sample
+        sample = controller.tobii_cont.getCurrentSample()
+        left_pupil, left_validity, right_pupil, right_validity = \
+            controller.tobii_cont.getPupilsandValidity(sample)
+        left_x, left_y, right_x, right_y = \
+            controller.tobii_cont.getGazePosition(sample)
+        left.update(left_pupil, left_validity, left_x, left_y)
+        right.update(right_pupil, right_validity, right_x, right_y)
 
+        # draw appropriate figures to visualize gaze on both screens
+        left.draw()
+        right.draw()
         # draw instruction
         press_text.draw()
 
@@ -0,0 +1,89 @@
+'''
+Background thread that takes gaze samples from a SampleQueue while tracking
+is running and adds them to a SampleStore and/or streams them to disk, so
+that the tracker's callback thread only hands samples over and a session does
+not have to be held in memory until the end of the task.
+'''
+import os
+import threading
+
+import numpy as np
+
+
+class GazeWriter(threading.Thread):
+
+    # queue: samplequeue.SampleQueue the tracker callback puts samples into
+    # store: samplestore.SampleStore the samples are added to, or None
+    # path: spool file that formatted rows are appended to, or None
+    # formatter: function turning one sample into a line (without newline)
+    # chunksize: max number of rows taken and written at a time
+    # interval: seconds between drains of the queue
+    # rawpath, dtype: if given, rows are also appended to rawpath as binary
+    # records of dtype, which can be read back with np.fromfile
+    # monitor: quality.QualityMonitor the rows are also added to, or None
+    def __init__(self, queue, store=None, path=None, formatter=None,
+                 header=None, chunksize=512, interval=0.02, rawpath=None,
+                 dtype=None, monitor=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.queue = queue
+        self.store = store
+        self.path = path
+        self.formatter = formatter
+        self.header = header
+        self.chunksize = chunksize
+        self.interval = interval
+        self.rawpath = rawpath
+        self.dtype = dtype
+        self.monitor = monitor
+        self.spool = None
+        self.raw = None
+        self.stopped = threading.Event()
+        self.written = 0
+
+    def run(self):
+        if self.path is not None:
+            self.spool = open(self.path, 'w')
+            if self.header is not None:
+                self.spool.write(self.header + '\n')
+        if self.rawpath is not None:
+            self.raw = open(self.rawpath, 'wb')
+        while not self.stopped.is_set():
+            self.stopped.wait(self.interval)
+            self.drain()
+        # take whatever arrived before close() was called
+        self.drain()
+        for f in (self.spool, self.raw):
+            if f is not None:
+                f.close()
+
+    def drain(self):
+        rows = self.queue.take(self.chunksize)
+        while len(rows) > 0:
+            if self.store is not None:
+                self.store.extend(rows)
+            if self.spool is not None:
+                self.spool.write('\n'.join(map(self.formatter, rows)) + '\n')
+            if self.raw is not None:
+                np.array(rows, dtype=self.dtype).tofile(self.raw)
+            if self.monitor is not None:
+                self.monitor.extend(rows)
+            self.written += len(rows)
+            rows = self.queue.take(self.chunksize)
+        for f in (self.spool, self.raw):
+            if f is not None:
+                f.flush()
+
+    def close(self):  # stops the thread once the queue has been emptied
+        self.stopped.set()
+        self.join()
+
+    def stats(self):
+        stats = self.queue.stats()
+        stats['written'] = self.written
+        return stats
+
+    def remove(self):
+        for path in (self.path, self.rawpath):
+            if path is not None and os.path.isfile(path):
+                os.remove(path)
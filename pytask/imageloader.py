@@ -0,0 +1,117 @@
+'''
+Decodes the images of a task ahead of time on a worker thread, so that disk
+reads and decoding happen while earlier trials run instead of between an
+onset being scheduled and its flip.
+'''
+import collections
+import threading
+import time
+
+import numpy as np
+
+import Image
+
+
+def decode(path):
+    image = Image.open(path)
+    image.load()  # PIL only reads the header until the pixels are used
+    return image
+
+
+class ImagePreloader(threading.Thread):
+
+    # paths: image files in the order they will be shown
+    # ahead: how many images from the one being shown on to keep decoded
+    # size: max number of decoded images kept; the least recently used go
+    def __init__(self, paths, ahead=3, size=8):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.paths = list(paths)
+        self.ahead = ahead
+        self.size = max(size, ahead)
+        self.cache = collections.OrderedDict()  # path: decoded image
+        self.cond = threading.Condition()
+        self.position = 0  # index of the image being asked for
+        self.next = 0  # index of the next image to decode
+        self.loading = None  # index the worker is decoding
+        self.stopped = False
+        self.decoded = {}  # index: seconds taken to decode on the worker
+        self.waits = {}  # index: seconds get() waited for it
+        self.missed = set()  # indexes decoded by get() itself
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.stopped and (
+                        self.next >= len(self.paths) or
+                        self.next >= self.position + self.ahead):
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                index = self.next
+                self.next += 1
+                path = self.paths[index]
+                if path in self.cache:
+                    continue
+                self.loading = index
+            start = time.time()
+            image = decode(path)
+            with self.cond:
+                self.decoded[index] = time.time() - start
+                self.store(path, image)
+                self.loading = None
+                self.cond.notify_all()
+
+    def store(self, path, image):  # call with cond held
+        self.cache[path] = image
+        while len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+
+    def get(self, index, timeout=None):
+        """
+        decoded image index of paths. waits up to timeout seconds for the
+        worker to start on it (for ever if None), then decodes it on the
+        calling thread
+        """
+        path = self.paths[index]
+        start = time.time()
+        with self.cond:
+            self.position = max(self.position, index)
+            self.cond.notify_all()
+            while path not in self.cache and (self.next <= index or
+                                              self.loading == index):
+                remaining = (None if timeout is None
+                             else start + timeout - time.time())
+                if remaining is not None and remaining <= 0:
+                    if self.loading != index:
+                        break
+                    remaining = None  # the worker will be done first
+                self.cond.wait(remaining)
+            image = self.cache.pop(path, None)
+            if image is not None:
+                self.cache[path] = image  # now the most recently used
+        if image is None:  # not decoded in time, or already dropped
+            self.missed.add(index)
+            decode_start = time.time()
+            image = decode(path)
+            self.decoded[index] = time.time() - decode_start
+            with self.cond:
+                self.store(path, image)
+        self.waits[index] = time.time() - start
+        return image
+
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.join()
+
+    def report(self):
+        if len(self.waits) == 0:
+            return
+        decoded = 1000 * np.array(self.decoded.values())
+        waits = 1000 * np.array(self.waits.values())
+        print ('Images: %d shown, decode %.1f ms median / %.1f ms max, '
+               'waited %.1f ms max, %d not ready in time' % (
+                   len(waits), np.median(decoded), decoded.max(),
+                   waits.max(), len(self.missed)))
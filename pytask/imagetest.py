@@ -4,6 +4,7 @@ Code for image display test.
 from psychopy import visual, core, gui
 import numpy as np
 import display
+import imageloader
 import os
 
 
@@ -103,9 +104,14 @@ def imagetest(controller, outfile):
     # parameters for task
     iti_mean = 3
     iti_range = 2
+    # decode images ahead on a worker thread
+    loader = imageloader.ImagePreloader(
+        [os.path.join(os.getcwd(), 'images', image) for image in images])
+    loader.start()
     # set up image stim object
-    stim = visual.ImageStim(testWin, image=os.path.join(os.getcwd(), 'images', images[0]),
+    stim = visual.ImageStim(testWin, image=loader.get(0),
                             units='norm', size=(1.0, 1.0))
+    uploads = [0.0]  # seconds to set each image on the stim
     # display instructions
     display.text_keypress(
         testWin, 'In this task, you will view some images. \n Press any key when ready to begin.')
@@ -125,19 +131,29 @@ def imagetest(controller, outfile):
 
     core.wait(2.0)  # give small wait time before starting trial
 
-    for image in images:
+    for i, image in enumerate(images):
         if not controller.testing:
-            # RECORD TIMESTAMP FOR IMAGE DISPLAY
-            controller.tobii_cont.recordEvent('imagetime')
             # record whether it is a fearful image or not
             if 'fear' in image:
-                controller.tobii_cont.addParam('isfear', 1)
+                controller.tobii_cont.addParam('isfear', 1, event='imagetime')
             else:
-                controller.tobii_cont.addParam('isfear', 0)
-
-        # display image
-        stim.setImage(os.path.join(os.getcwd(), 'images', image))
+                controller.tobii_cont.addParam('isfear', 0, event='imagetime')
+            # time (ms) spent getting this image ready during the last iti
+            controller.tobii_cont.addColumnValue(
+                'image_decode', '%.1f' % (1000 * loader.decoded.get(i, 0)),
+                event='imagetime')
+            controller.tobii_cont.addColumnValue(
+                'image_wait', '%.1f' % (1000 * loader.waits[i]),
+                event='imagetime')
+            controller.tobii_cont.addColumnValue(
+                'image_upload', '%.1f' % (1000 * uploads[i]),
+                event='imagetime')
+
+        # display image, which was set on the stim during the last iti
         stim.draw()
+        if not controller.testing:
+            # RECORD TIMESTAMP FOR IMAGE DISPLAY when it is flipped on
+            controller.tobii_cont.recordEventOnFlip(testWin, 'imagetime')
         testWin.flip()
 
         # wait for predetermined stim_dur time
@@ -145,10 +161,22 @@ def imagetest(controller, outfile):
 
         # clear screen
         testWin.flip()
+        iti_start = core.getTime()
 
         iti = iti_mean + iti_range * (2 * np.random.random() - 1)
 
-        core.wait(iti)
+        # set the next image while the screen is blank, waiting at most half
+        # the iti for it to be decoded
+        if i + 1 < len(images):
+            next_image = loader.get(i + 1, timeout=iti / 2)
+            upload_start = core.getTime()
+            stim.setImage(next_image)
+            uploads.append(core.getTime() - upload_start)
+
+        core.wait(max(0, iti - (core.getTime() - iti_start)))
+
+    loader.close()
+    loader.report()
 
     # STOP EYE TRACKING AND SAVE DATA
     if not controller.testing:
@@ -53,27 +53,27 @@ def lightdarktest(controller, mode, outfile):
         controller.tobii_cont.setParam('task', task)
 
     for i in range(numtrials):
-        core.wait(2.0)
+        display.wait(controller, 2.0)
+
+        # record timestamp on tracker for start of stimulus, on its flip
+        if not controller.testing:
+            controller.tobii_cont.recordEventOnFlip(testWin, 'ontime')
 
         # display stimulus
         display.fill_screen(testWin, stim_mat[i])
 
-        # record timestamp on tracker for start of stimulus
-        if not controller.testing:
-            controller.tobii_cont.recordEvent('ontime')
-
         # wait for stimulus
-        core.wait(stim_dur[0][i])
+        display.wait(controller, stim_dur[0][i])
+
+        # record timestamp on tracker for end of stimulus, on its flip
+        if not controller.testing:
+            controller.tobii_cont.recordEventOnFlip(testWin, 'offtime')
 
         # display recovery
         display.fill_screen(testWin, rec_mat[i])
 
-        # record timestamp on tracker for end of stimulus
-        if not controller.testing:
-            controller.tobii_cont.recordEvent('offtime')
-
         # wait for recovery
-        core.wait(recover_dur[0][i])
+        display.wait(controller, recover_dur[0][i])
 
     # End eye tracking
     if not controller.testing:
@@ -1,7 +1,5 @@
 import numpy as np
-from psychopy import prefs
-prefs.general['audioLib'] = ['pyo']
-from psychopy import visual, core, sound, event, gui
+from psychopy import gui
 import display
 import os
 
@@ -46,10 +44,8 @@ def oddball(controller, outfile):
     # set up window
     # Create window to display test
     testWin = controller.testWin
-    # load sounds
-    resource_path = '../task/'
-    lowsnd = sound.Sound(resource_path + '500.wav')
-    highsnd = sound.Sound(resource_path + '1000.wav')
+    # sounds are loaded at startup
+    sounds = controller.sounds
     # parameters for task
     iti_mean = 3
     iti_range = 2
@@ -57,10 +53,10 @@ def oddball(controller, outfile):
     display.text_keypress(
         testWin, 'In this task, you will listen to some sounds. \n Press any key to continue')
     # play sound samples
-    lowsnd.play()
+    sounds.play('500.wav')
     display.text_keypress(
         testWin, 'Some sounds are low... \n Press any key to continue')
-    highsnd.play()
+    sounds.play('1000.wav')
     display.text_keypress(
         testWin, '...and some are high. \n Press any key to continue')
 
@@ -75,25 +71,28 @@ def oddball(controller, outfile):
         controller.tobii_cont.setDataFile(outfile)
         controller.tobii_cont.startTracking()
         controller.tobii_cont.setEventsAndParams(
-            ['task', 'soundtime', 'presstime', 'iti_mean', 'iti_range', 'trialvec'])
+            ['task', 'soundtime', 'soundoffset', 'presstime', 'iti_mean', 'iti_range', 'trialvec'])
         controller.tobii_cont.setParam('task', 'oddball')
         controller.tobii_cont.setParam('iti_mean', iti_mean)
         controller.tobii_cont.setParam('iti_range', iti_range)
         controller.tobii_cont.setVector('trialvec', trialvec)
 
-    core.wait(2.0)  # give small wait time before starting trial
+    display.wait(controller, 2.0)  # give small wait time before starting trial
 
     for isHigh in trialvec:
         # RECORD TIMESTAMP FOR SOUND PLAY
         if not controller.testing:
             controller.tobii_cont.recordEvent('soundtime')
         if isHigh:
-            highsnd.play()  # play high sound if oddball
+            offset = sounds.play('1000.wav')  # play high sound if oddball
         else:
-            lowsnd.play()  # otherwise play low sound
+            offset = sounds.play('500.wav')  # otherwise play low sound
+        if not controller.testing:  # from soundtime to the sound being heard
+            controller.tobii_cont.addColumnValue(
+                'soundoffset', '%.2f' % (1000 * offset))
 
         # wait for space bar
-        keypress = event.waitKeys(keyList=['space', 'q'])
+        keypress = display.wait_keys(controller, keyList=['space', 'q'])
         if keypress[0] == 'q':
             break
         elif keypress[0] == 'space':
@@ -103,7 +102,7 @@ def oddball(controller, outfile):
 
         iti = iti_mean + iti_range * (2 * np.random.random() - 1)
 
-        core.wait(iti)
+        display.wait(controller, iti)
 
     # STOP EYE TRACKING AND SAVE DATA
     if not controller.testing:
@@ -1,4 +1,4 @@
-from psychopy import core, gui
+from psychopy import gui
 import display
 
 
@@ -35,7 +35,7 @@ def pst(controller, outfile):
         controller.tobii_cont.setParam('task', 'pst')
         controller.tobii_cont.setParam('duration', duration)
 
-    core.wait(duration)
+    display.wait(controller, duration)
 
     if not controller.testing:
         controller.tobii_cont.stopTracking()
@@ -0,0 +1,113 @@
+'''
+Rolling measures of the quality of the gaze data while a task runs, so that
+lost eyes show up on the experimenter's screen instead of after the session
+is saved. Samples are added in the writer thread as they are taken from the
+queue; every statistic is kept as running sums over the last window seconds,
+so each sample costs the same however long the window is.
+'''
+import collections
+import threading
+
+import samplestore
+
+FIELDS = samplestore.FIELDS
+RESUM = 100000  # samples between exact recomputations of the running sums
+
+
+class QualityMonitor:
+
+    # window: seconds of samples the statistics are over
+    def __init__(self, window=10.0):
+        self.window = window * 1e6  # timestamps are in us
+        # (timestamp, left valid, right valid, left pupil, right pupil,
+        # whether a blink starts) of each sample in the window
+        self.samples = collections.deque()
+        self.lock = threading.Lock()
+        self.valid = [0, 0]
+        self.sums = [0.0, 0.0]  # of valid pupils
+        self.squares = [0.0, 0.0]
+        self.blinks = 0
+        self.blinking = False
+        self.total = 0
+        self.updates = 0
+
+    def extend(self, rows):
+        with self.lock:
+            for row in rows:
+                self.add(row)
+            if self.updates >= RESUM:
+                self.resum()
+
+    def add(self, row):  # call with lock held
+        pupils = []
+        for eye in ('Left', 'Right'):
+            pupil = row[FIELDS[eye + 'Pupil']]
+            if row[FIELDS[eye + 'Validity']] == samplestore.INVALID or pupil <= 0:
+                pupils.append(None)
+            else:
+                pupils.append(pupil)
+        lost = pupils == [None, None]
+        sample = (row[0], pupils[0] is not None, pupils[1] is not None,
+                  pupils[0], pupils[1], lost and not self.blinking)
+        self.blinking = lost
+        self.samples.append(sample)
+        self.count(sample, 1)
+        while self.samples[0][0] < row[0] - self.window:
+            self.count(self.samples.popleft(), -1)
+        self.total += 1
+        self.updates += 1
+
+    def count(self, sample, sign):  # adds (1) or removes (-1) a sample
+        for eye in (0, 1):
+            if sample[1 + eye]:
+                pupil = sample[3 + eye]
+                self.valid[eye] += sign
+                self.sums[eye] += sign * pupil
+                self.squares[eye] += sign * pupil * pupil
+        if sample[5]:
+            self.blinks += sign
+
+    def resum(self):  # removes the rounding error of many additions
+        self.valid = [0, 0]
+        self.sums = [0.0, 0.0]
+        self.squares = [0.0, 0.0]
+        self.blinks = 0
+        for sample in self.samples:
+            self.count(sample, 1)
+        self.updates = 0
+
+    def snapshot(self):
+        """
+        statistics over the window: samples, fraction valid of each eye,
+        blinks per minute and mean and sd of each eye's valid pupils
+        """
+        with self.lock:
+            n = len(self.samples)
+            stats = {'samples': n, 'total': self.total, 'valid': [0.0, 0.0],
+                     'mean': [0.0, 0.0], 'sd': [0.0, 0.0], 'blinks': 0.0}
+            if n == 0:
+                return stats
+            span = (self.samples[-1][0] - self.samples[0][0]) / 1e6
+            if span > 0:
+                stats['blinks'] = 60 * self.blinks / span
+            for eye in (0, 1):
+                valid = self.valid[eye]
+                stats['valid'][eye] = valid / float(n)
+                if valid > 0:
+                    mean = self.sums[eye] / valid
+                    var = self.squares[eye] / valid - mean * mean
+                    stats['mean'][eye] = mean
+                    stats['sd'][eye] = max(var, 0.0) ** 0.5
+            return stats
+
+
+def describe(stats):  # lines of text for the experimenter's screen
+    if stats['samples'] == 0:
+        return 'No gaze data yet'
+    lines = []
+    for eye, name in ((0, 'Left'), (1, 'Right')):
+        lines.append('%s: %.0f%% valid, pupil %.2f +/- %.2f mm' % (
+            name, 100 * stats['valid'][eye], stats['mean'][eye],
+            stats['sd'][eye]))
+    lines.append('Blinks: %.0f per minute' % stats['blinks'])
+    return '\n'.join(lines)
@@ -0,0 +1,399 @@
+'''
+Recording and saving of gaze samples, events and params, independent of
+where the samples come from. TobiiController (TobiiControllerP.py) feeds it
+from the Tobii SDK and SimulatedController (simtracker.py) from a synthetic
+or replayed source; subclasses provide startSource, stopSource,
+getLocalTime and localToTracker.
+'''
+import itertools
+import os
+
+import numpy as np
+
+import clocksync
+import gazewriter
+import quality
+import samplequeue
+import samplestore
+
+GAZE_COLUMNS = ['Timestamp',
+                'LeftEyePosition3D',  # left eye
+                'LeftEyePosition3DRelative',
+                'LeftGazePoint3D',
+                'LeftGazePoint2D',
+                'LeftPupil',
+                'LeftValidity',
+                'RightEyePosition3D',  # right eye
+                'RightEyePosition3DRelative',
+                'RightGazePoint3D',
+                'RightGazePoint2D',
+                'RightPupil',
+                'RightValidity']
+FLUSH_CHUNK = 4096  # rows formatted and written at a time when saving
+FIELDS = samplestore.FIELDS
+
+
+class Recorder:
+
+    def __init__(self):
+        self.samples = samplestore.SampleStore()
+        # samples go from the tracker's thread through the queue to a
+        # writer thread, which adds them to samples or streams them to disk
+        self.queue = samplequeue.SampleQueue()
+        self.events = []
+        self.eventData = {}
+        self.datafile = None
+        # if streaming, samples are written to disk by a background thread
+        # while tracking instead of being kept in memory until the end
+        self.streaming = False
+        self.writer = None
+        self.monitor = None  # quality of the samples while tracking
+        self.writerStats = None
+        self.latencyStats = None  # queue stats of the last recording
+        # events are recorded in local clock time and converted to tracker
+        # time with a model fitted to clock readings taken while tracking
+        self.clockModel = clocksync.ClockModel()
+        self.clockSampler = None
+        self.localEvents = set()  # columns holding local times
+        # every recorded event as [time, event, {param: value}], with the
+        # values added after it, for the sparse events file (see writeEvents)
+        self.eventLog = []
+        # values added for an event before it is recorded, {event: {param:
+        # value}}, which go with the next time that event is recorded
+        self.pendingValues = {}
+        # if denseEvents, event and param columns are also written next to
+        # the gaze columns of the data file, one value per sample row
+        self.denseEvents = True
+        # if binary, a typed .npz copy of each session is saved next to the
+        # data file (see saveBinary)
+        self.binary = False
+
+    def startSource(self):  # starts calling on_gazedata or addSample
+        raise NotImplementedError
+
+    def stopSource(self):
+        raise NotImplementedError
+
+    def getLocalTime(self):  # local clock (us); must be fast to read
+        raise NotImplementedError
+
+    def localToTracker(self, t):  # tracker time of a local time (may be slow)
+        raise NotImplementedError
+
+    def syncClocks(self):  # (local, tracker) pair for the clock model
+        t = self.getLocalTime()
+        return t, self.localToTracker(t)
+
+    def startTracking(self):
+        self.eventData = {}
+        self.events = []
+        self.queue = samplequeue.SampleQueue()
+        self.samples = samplestore.SampleStore()
+        self.localEvents = set()
+        self.eventLog = []
+        self.pendingValues = {}
+        self.clockModel = clocksync.ClockModel()
+        self.clockSampler = clocksync.ClockSampler(self.syncClocks,
+                                                   self.clockModel)
+        self.clockSampler.start()
+        self.monitor = quality.QualityMonitor()
+        self.startWriter()
+        self.startSource()
+
+    def stopTracking(self):
+        self.stopSource()
+        self.writer.close()
+        self.latencyStats = self.queue.stats()
+        self.printLatency()
+        self.clockSampler.close()
+        self.convertEvents()
+        self.flushData()
+        self.writer = None
+        self.monitor = None
+        self.samples.clear()
+        self.eventData = {}
+        self.events = []
+        self.eventLog = []
+        self.pendingValues = {}
+
+    def on_gazedata(self, error, gaze):  # callback for SDK gaze objects
+        self.addSample(samplestore.unpack(gaze))
+
+    def addSample(self, row):  # row: tuple of values in SAMPLE_DTYPE order
+        self.queue.put(row)
+
+    # starts the thread that takes samples from the queue. if streaming, it
+    # writes gaze columns to a spool file next to the data file instead of
+    # keeping them; event columns are only known at the end, so they are
+    # added in flushData
+    def startWriter(self):
+        self.writerStats = None
+        if not self.streaming or self.datafile == None:
+            self.writer = gazewriter.GazeWriter(self.queue, self.samples,
+                                                monitor=self.monitor)
+            self.writer.start()
+            return
+        if self.binary:
+            rawpath = self.datafile.name + '.raw'
+        else:
+            rawpath = None
+        self.writer = gazewriter.GazeWriter(self.queue,
+                                            path=self.datafile.name + '.part',
+                                            formatter=samplestore.format_row,
+                                            header='\t'.join(GAZE_COLUMNS),
+                                            rawpath=rawpath,
+                                            dtype=samplestore.SAMPLE_DTYPE,
+                                            monitor=self.monitor)
+        self.writer.start()
+
+    def printLatency(self):
+        stats = self.latencyStats
+        print ('Received %d samples (%d dropped), interval %.2f ms +/- %.2f '
+               'ms' % (stats['received'], stats['dropped'],
+                       stats['interval']['median'], stats['jitter']))
+        print ('Queue latency %(median).1f / %(p95).1f / %(p99).1f / %(max).1f'
+               ' ms (median / 95th / 99th percentile / max)' % stats['latency'])
+
+    # modified to return relative coordinates rather than pixel coordinates
+    def getGazePosition(self, gaze):
+        return ((float(gaze[FIELDS['LeftGazePoint2D_x']]) - 0.5) * 2,
+                (0.5 - float(gaze[FIELDS['LeftGazePoint2D_y']])) * 2,
+                (float(gaze[FIELDS['RightGazePoint2D_x']]) - 0.5) * 2,
+                (0.5 - float(gaze[FIELDS['RightGazePoint2D_y']])) * 2)
+
+    def getCurrentGazePosition(self):
+        gaze = self.queue.peek()
+        if gaze is None:
+            return (None, None, None, None)
+        else:
+            return self.getGazePosition(gaze)
+
+    def getQuality(self):  # quality.QualityMonitor stats, or None
+        if self.monitor is None:
+            return None
+        return self.monitor.snapshot()
+
+    def getCurrentSample(self):  # newest sample, or None
+        return self.queue.peek()
+
+    # waits up to timeout seconds for a sample after the first seen, and
+    # returns the number of samples received so far
+    def waitForSample(self, seen, timeout=None):
+        return self.queue.wait(seen, timeout)
+
+    def getCurrentPupilsandValidity(self):  # added
+        gaze = self.queue.peek()
+        if gaze is None:
+            return(None, None, None, None)
+        else:
+            return self.getPupilsandValidity(gaze)
+
+    def getPupilsandValidity(self, gaze):  # added
+        return (float(gaze[FIELDS['LeftPupil']]),
+                int(gaze[FIELDS['LeftValidity']]),
+                float(gaze[FIELDS['RightPupil']]),
+                int(gaze[FIELDS['RightValidity']]))
+
+    # altered to take open file instead of filename. got rid of header which
+    # makes the file incompatible with matlab
+    def setDataFile(self, openfile):
+        self.datafile = openfile
+
+    # altered to simply flush data, but not close file
+    def closeDataFile(self):
+        if self.datafile != None:
+            self.flushData()
+
+        self.datafile = None
+
+    # records local timestamp t for an event, by default the current time
+    def recordEvent(self, event, t=None):
+        if t is None:
+            t = self.getLocalTime()
+        self.eventData[event].append(t)
+        self.localEvents.add(event)
+        self.eventLog.append([t, event, self.pendingValues.pop(event, {})])
+
+    # records event at the next flip of win, from PsychoPy's flip callback
+    # that runs right after the buffer swap. the flip's delay (ms) after this
+    # call goes in <event>_delay, and <event>_missed is 1 if it came over 1.2
+    # refreshes after the call (the frame missed the first refresh it could
+    # have made, as PsychoPy counts dropped frames)
+    def recordEventOnFlip(self, win, event):
+        win.callOnFlip(self.recordFlip, win, event, self.getLocalTime())
+
+    def recordFlip(self, win, event, requested):
+        t = self.getLocalTime()
+        self.recordEvent(event, t)
+        delay = (t - requested) / 1000.0
+        period = 1000.0 * getattr(win, 'monitorFramePeriod', 1 / 60.0)
+        self.addColumnValue(event + '_delay', '%.2f' % delay)
+        self.addColumnValue(event + '_missed', int(delay > 1.2 * period))
+
+    # adds the column if needed. see logValue for event
+    def addColumnValue(self, param, value, event=None):
+        if param not in self.eventData:
+            self.events = self.events + [param]
+            self.eventData[param] = []
+        self.eventData[param].append(value)
+        self.logValue(param, value, event)
+
+    # puts value with an event in the events file: by default the last one
+    # recorded (e.g. correct after soundtime), or if event is given, the
+    # next time that event is recorded (e.g. isfear before imagetime)
+    def logValue(self, param, value, event=None):
+        if event is not None:
+            self.pendingValues.setdefault(event, {})[param] = value
+        elif len(self.eventLog) > 0:
+            self.eventLog[-1][2][param] = value
+
+    # converts the recorded events to tracker time with the clock model and
+    # adds its parameters as params, so event times can be recomputed
+    def convertEvents(self):
+        self.clockModel.fit()
+        for event in self.localEvents:
+            self.eventData[event] = self.clockModel.convert(
+                self.eventData[event])
+        self.localEvents = set()
+        times = self.clockModel.convert([entry[0] for entry in self.eventLog])
+        for entry, t in zip(self.eventLog, times):
+            entry[0] = t
+        if len(self.events) > 0:  # only if the task set its columns
+            self.events = self.events + clocksync.PARAMS
+            for param, value in zip(clocksync.PARAMS,
+                                    self.clockModel.params()):
+                self.eventData[param] = [value]
+
+    # appends value to param list. see logValue for event
+    def addParam(self, param, value, event=None):
+        self.eventData[param].append(value)
+        self.logValue(param, value, event)
+
+    def setParam(self, param, value):  # sets value for param
+        self.eventData[param] = [value]
+
+    def setVector(self, param, vector):  # sets a vector in a column
+        self.eventData[param] = vector
+
+    # creates columns for events and params
+    def setEventsAndParams(self, events):
+        self.events = events
+        for event in events:
+            self.eventData[event] = []
+
+    def denseColumns(self):  # event and param columns of the data file
+        if self.denseEvents:
+            return self.events
+        return []
+
+    def eventColumns(self, n):  # event columns of rows 0 to n-1
+        columns = [self.eventData[event] for event in self.denseColumns()]
+        for event, column in zip(self.denseColumns(), columns):
+            if len(column) > n:
+                print ('%d values of %s come after the last sample; they are'
+                       ' only in the events file' % (len(column) - n, event))
+        return samplestore.join_columns(columns, n)
+
+    def eventsPath(self):  # sparse events file next to the data file
+        return os.path.splitext(self.datafile.name)[0] + '.events.tsv'
+
+    # writes the events to a sparse table: a row per recorded event with its
+    # time, name and the values added after it (e.g. correct after
+    # soundtime), then a row per value of each param set for the whole
+    # session (task, trialvec, clock_*), which have no time. utils.read_events
+    # in pyanalysis reads it back
+    def writeEvents(self):
+        if len(self.eventLog) == 0 and len(self.events) == 0:
+            return
+        for event, values in self.pendingValues.items():
+            print ('%s was not recorded after %s were added for it; they'
+                   ' are left out of the events file' % (
+                       event, ', '.join(sorted(values))))
+        timed = set(entry[1] for entry in self.eventLog)
+        logged = set()
+        for entry in self.eventLog:
+            logged.update(entry[2])
+        columns = ([param for param in self.events if param in logged] +
+                   sorted(logged.difference(self.events)))
+        with open(self.eventsPath(), 'w') as eventfile:
+            eventfile.write('\t'.join(['Timestamp', 'event', 'value'] +
+                                      columns) + '\n')
+            eventfile.write(''.join([
+                '\t'.join([str(t), event, ''] +
+                          [str(values.get(param, '')) for param in columns]) +
+                '\n' for t, event, values in self.eventLog]))
+            padding = '\t' * len(columns)
+            for param in self.events:
+                if param in timed or param in logged:
+                    continue
+                eventfile.write(''.join([
+                    '\t%s\t%s%s\n' % (param, value, padding)
+                    for value in self.eventData[param]]))
+
+    # altered to create data file that is easily imported into matlab
+    def flushData(self):
+        if self.datafile == None:
+            print 'data file is not set.'
+            return
+
+        self.writeEvents()
+        if self.writer != None and self.writer.path != None:
+            self.flushStream()
+            return
+
+        if len(self.samples) == 0:
+            return
+
+        self.datafile.write('\t'.join(GAZE_COLUMNS + self.denseColumns()))
+        self.datafile.write('\n')
+        data = self.samples.array()
+        events = self.eventColumns(len(data))
+        for i in xrange(0, len(data), FLUSH_CHUNK):  # one write per chunk
+            self.datafile.write(samplestore.format_rows(
+                data[i:i + FLUSH_CHUNK], events[i:i + FLUSH_CHUNK]))
+
+        self.datafile.flush()
+        if self.binary:
+            self.saveBinary(self.samples.array())
+
+    # merges the rows streamed by the writer with the event columns, giving
+    # the same layout as a non-streamed flush, then removes the spool file
+    def flushStream(self):
+        writer = self.writer
+        self.writer = None
+        self.writerStats = writer.stats()
+        print 'Streamed %(written)d of %(received)d samples (%(dropped)d dropped, %(delayed)d delayed)' % self.writerStats
+
+        if writer.written == 0:
+            writer.remove()
+            return
+
+        self.datafile.write('\t'.join(GAZE_COLUMNS + self.denseColumns()))
+        self.datafile.write('\n')
+        events = self.eventColumns(writer.written)
+        with open(writer.path) as spool:
+            spool.readline()  # skip header
+            for i in xrange(0, writer.written, FLUSH_CHUNK):
+                lines = itertools.islice(spool, FLUSH_CHUNK)
+                self.datafile.write(''.join([
+                    line[:-1] + suffix + '\n'
+                    for line, suffix in itertools.izip(
+                        lines, events[i:i + FLUSH_CHUNK])]))
+
+        self.datafile.flush()
+        if self.binary:
+            self.saveBinary(np.fromfile(writer.rawpath,
+                                        dtype=samplestore.SAMPLE_DTYPE))
+        writer.remove()
+
+    # saves the session to an uncompressed .npz next to the data file: the
+    # samples as typed columns (with invalid eyes set to -1 as in the TSV),
+    # the event/param names in order, and each event/param list as its own
+    # array. it can be memory-mapped with utils.read_npz in pyanalysis
+    def saveBinary(self, samples):
+        path = os.path.splitext(self.datafile.name)[0] + '.npz'
+        arrays = {'samples': samplestore.mask_invalid(samples),
+                  'events': np.array(self.events, dtype=str)}
+        for event in self.events:
+            arrays['event_' + event] = np.asarray(self.eventData[event])
+        np.savez(path, **arrays)
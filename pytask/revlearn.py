@@ -1,7 +1,5 @@
 import numpy as np
-from psychopy import prefs
-prefs.general['audioLib'] = ['pyo']
-from psychopy import visual, core, sound, event, gui
+from psychopy import gui
 import display
 import os
 
@@ -46,10 +44,8 @@ def revlearn(controller, outfile):
     # Create window to display test
     testWin = controller.testWin
 
-    # load sounds
-    resource_path = '../task/'
-    wrongsnd = sound.Sound(resource_path + 'buzz1.wav')
-    rightsnd = sound.Sound(resource_path + 'dinga.wav')
+    # sounds are loaded at startup
+    sounds = controller.sounds
 
     # parameters for task
     iti_mean = 3
@@ -63,10 +59,10 @@ def revlearn(controller, outfile):
                                      '(Press any key to continue)'))
 
     # sound samples
-    rightsnd.play()
+    sounds.play('dinga.wav')
     display.text_keypress(
         testWin,  'You will hear this for correct responses. \n (Press any key to continue)')
-    wrongsnd.play()
+    sounds.play('buzz1.wav')
     display.text_keypress(
         testWin,  'And this for incorrect responses. \n (Press any key to continue)')
     display.text_keypress(
@@ -80,20 +76,20 @@ def revlearn(controller, outfile):
         controller.tobii_cont.setDataFile(outfile)
         controller.tobii_cont.startTracking()
         controller.tobii_cont.setEventsAndParams(
-            ['task', 'soundtime', 'presstime', 'cuetime', 'correct', 'choice', 'iti_mean', 'iti_range', 'trialvec'])
+            ['task', 'soundtime', 'soundoffset', 'presstime', 'cuetime', 'correct', 'choice', 'iti_mean', 'iti_range', 'trialvec'])
         controller.tobii_cont.setParam('task', 'revlearn')
         controller.tobii_cont.setParam('iti_mean', iti_mean)
         controller.tobii_cont.setParam('iti_range', iti_range)
         controller.tobii_cont.setVector('trialvec', trialvec)
-    core.wait(2)
+    display.wait(controller, 2)
 
     for isTrue in trialvec:
-        # display cross
-        display.cross(testWin)
+        # display cross, timestamped on its flip
         if not controller.testing:
-            controller.tobii_cont.recordEvent('cuetime')
+            controller.tobii_cont.recordEventOnFlip(testWin, 'cuetime')
+        display.cross(testWin)
 
-        keypress = event.waitKeys(keyList=['left', 'right', 'q'])
+        keypress = display.wait_keys(controller, keyList=['left', 'right', 'q'])
         if not controller.testing:
             controller.tobii_cont.recordEvent('presstime')
             controller.tobii_cont.addParam('choice', keypress[0])
@@ -102,22 +98,25 @@ def revlearn(controller, outfile):
         elif (keypress[0] == 'left' and not isTrue) or (keypress[0] == 'right' and isTrue):
             if not controller.testing:
                 controller.tobii_cont.recordEvent('soundtime')
-            rightsnd.play()
+            offset = sounds.play('dinga.wav')
             correct = 1
         else:
             if not controller.testing:
                 controller.tobii_cont.recordEvent('soundtime')
-            wrongsnd.play()
+            offset = sounds.play('buzz1.wav')
             correct = 0
         if not controller.testing:
+            # from soundtime to the sound being heard
+            controller.tobii_cont.addColumnValue(
+                'soundoffset', '%.2f' % (1000 * offset))
             controller.tobii_cont.addParam('correct', correct)
         # outcome period
-        core.wait(1.0)
+        display.wait(controller, 1.0)
         # clear screen
         testWin.flip(clearBuffer=True)
 
         iti = iti_mean + iti_range * (2 * np.random.random() - 1)
-        core.wait(iti)
+        display.wait(controller, iti)
 
     # stop eye tracking and save data
     if not controller.testing:
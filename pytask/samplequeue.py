@@ -0,0 +1,108 @@
+'''
+Hand-off of gaze samples from the tracker's callback thread (the only
+producer) to the thread that stores and writes them (the only consumer),
+without locks. Live readers on the PsychoPy thread only look at the latest
+sample. Arrival times are kept so each recording can report how long samples
+waited and how regularly they arrived.
+'''
+import array
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+def summarize(values):  # percentiles (ms) of an array of seconds
+    if len(values) == 0:
+        return {'n': 0, 'median': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ms = 1000 * np.array(values, dtype=float)
+    median, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'n': len(ms), 'median': median, 'p95': p95, 'p99': p99,
+            'max': ms.max()}
+
+
+class SampleQueue:
+
+    # maxsize: samples that can wait for the consumer before new ones are
+    # dropped
+    # max_delay: samples waiting longer than this (s) are counted as delayed
+    def __init__(self, maxsize=65536, max_delay=1.0):
+        self.maxsize = maxsize
+        self.max_delay = max_delay
+        # deque append/popleft are atomic, so put and take need no lock
+        self.buffer = collections.deque()
+        self.latest = None  # (arrival time, row) of the newest sample
+        self.received = 0
+        self.dropped = 0
+        self.delayed = 0
+        self.max_pending = 0
+        self.intervals = array.array('f')  # between arrivals (s)
+        self.latencies = array.array('f')  # from arrival to take (s)
+        self.ages = array.array('f')  # of the latest sample when read (s)
+        # set by put only while a reader waits in wait(), so the tracker's
+        # thread takes no lock when nobody is waiting
+        self.arrived = threading.Event()
+        self.waiting = False
+
+    def put(self, row):  # called from the tracker's callback thread
+        arrived = time.time()
+        if self.latest is not None:
+            self.intervals.append(arrived - self.latest[0])
+        # replaced in one assignment, so a reader never sees a partial sample
+        self.latest = (arrived, row)
+        self.received += 1
+        if self.waiting:
+            self.arrived.set()
+        pending = len(self.buffer)
+        if pending >= self.maxsize:
+            self.dropped += 1
+            return
+        self.buffer.append(self.latest)
+        if pending >= self.max_pending:
+            self.max_pending = pending + 1
+
+    def take(self, n):  # called from the consumer: up to n oldest rows
+        rows = []
+        now = time.time()
+        while len(self.buffer) > 0 and len(rows) < n:
+            arrived, row = self.buffer.popleft()
+            self.latencies.append(now - arrived)
+            if now - arrived > self.max_delay:
+                self.delayed += 1
+            rows.append(row)
+        return rows
+
+    def peek(self):  # newest row, or None; for the live readers
+        latest = self.latest
+        if latest is None:
+            return None
+        self.ages.append(time.time() - latest[0])
+        return latest[1]
+
+    def wait(self, seen, timeout=None):
+        """
+        waits up to timeout seconds for a sample after the first seen ones to
+        be put, and returns the number received; for readers that only need
+        to act when there is a new sample
+        """
+        if self.received == seen:
+            self.arrived.clear()
+            self.waiting = True
+            # checked again after waiting is set, so a put in between is seen
+            if self.received == seen:
+                self.arrived.wait(timeout)
+            self.waiting = False
+        return self.received
+
+    def stats(self):
+        intervals = np.array(self.intervals, dtype=float)
+        return {'received': self.received,
+                'dropped': self.dropped,
+                'delayed': self.delayed,
+                'max_pending': self.max_pending,
+                'latency': summarize(self.latencies),
+                'age': summarize(self.ages),
+                'interval': summarize(intervals),
+                # sd of the time between samples (ms)
+                'jitter': 1000 * intervals.std() if len(intervals) else 0.0}
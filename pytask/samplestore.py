@@ -0,0 +1,132 @@
+'''
+Compact, array-backed storage for gaze samples. Each sample is kept as one
+row of a NumPy structured array instead of a full SDK gaze object.
+'''
+import itertools
+import operator
+
+import numpy as np
+
+# point attributes of a gaze sample and the coordinates they carry
+POINTS = [('EyePosition3D', 'xyz'),
+          ('EyePosition3DRelative', 'xyz'),
+          ('GazePoint3D', 'xyz'),
+          ('GazePoint2D', 'xy')]
+
+
+def make_dtype():  # fields in the same order as the columns of the data file
+    fields = [('Timestamp', 'f8')]
+    for eye in ('Left', 'Right'):
+        for point, coords in POINTS:
+            for c in coords:
+                fields.append((eye + point + '_' + c, 'f8'))
+        fields.append((eye + 'Pupil', 'f8'))
+        fields.append((eye + 'Validity', 'i4'))
+    return np.dtype(fields)
+
+SAMPLE_DTYPE = make_dtype()
+# position of each field in a sample tuple
+FIELDS = dict((name, i) for i, name in enumerate(SAMPLE_DTYPE.names))
+INVALID = 4  # validity code for an eye that was not found
+# fields of each eye that are written as -1 when the eye is invalid
+EYE_FIELDS = dict((eye, [name for name in SAMPLE_DTYPE.names
+                         if name.startswith(eye) and
+                         not name.endswith('Validity')])
+                  for eye in ('Left', 'Right'))
+
+
+def unpack(g):  # flattens an SDK gaze object into a tuple of plain values
+    return (g.Timestamp,
+            g.LeftEyePosition3D.x, g.LeftEyePosition3D.y, g.LeftEyePosition3D.z,
+            g.LeftEyePosition3DRelative.x, g.LeftEyePosition3DRelative.y,
+            g.LeftEyePosition3DRelative.z,
+            g.LeftGazePoint3D.x, g.LeftGazePoint3D.y, g.LeftGazePoint3D.z,
+            g.LeftGazePoint2D.x, g.LeftGazePoint2D.y,
+            g.LeftPupil, g.LeftValidity,
+            g.RightEyePosition3D.x, g.RightEyePosition3D.y, g.RightEyePosition3D.z,
+            g.RightEyePosition3DRelative.x, g.RightEyePosition3DRelative.y,
+            g.RightEyePosition3DRelative.z,
+            g.RightGazePoint3D.x, g.RightGazePoint3D.y, g.RightGazePoint3D.z,
+            g.RightGazePoint2D.x, g.RightGazePoint2D.y,
+            g.RightPupil, g.RightValidity)
+
+INVALID_EYE = (-1.0,) * 12  # points and pupil written for an invalid eye
+ROW_FORMAT = '\t'.join(['%.1f'] + 2 * ['(%s, %s, %s)', '(%s, %s, %s)',
+                                       '(%s, %s, %s)', '(%s, %s)',
+                                       '%.2f', '%d'])
+
+
+# formats one sample (tuple or record of plain values) as a line of the data
+# file, writing -1 for the points and pupil of an invalid eye
+def format_row(row):
+    left = row[1:13] if row[13] != INVALID else INVALID_EYE
+    right = row[14:26] if row[26] != INVALID else INVALID_EYE
+    return ROW_FORMAT % ((row[0],) + tuple(left) + (row[13],) +
+                         tuple(right) + (row[26],))
+
+
+def format_rows(data, suffixes=None):
+    """
+    text of the data file lines for an array of samples, each line ending
+    with its string from suffixes (e.g. event columns) and a newline. gives
+    the same text as format_row on every row, but masks invalid eyes over
+    the whole array and formats all rows with one % operation
+    """
+    rows = mask_invalid(data).tolist()
+    if suffixes is None:
+        suffixes = [''] * len(rows)
+    values = tuple(itertools.chain.from_iterable(
+        itertools.imap(operator.add, rows, [(s,) for s in suffixes])))
+    return ''.join([ROW_FORMAT + '%s\n'] * len(rows)) % values
+
+
+def join_columns(columns, n):
+    """
+    strings for rows 0 to n-1 of the given columns (lists of values, written
+    with str()), each a tab followed by the row's values joined by tabs. a
+    row past the end of a column has an empty cell there
+    """
+    rows = ['\t' + '\t'.join(values) for values in itertools.izip_longest(
+        *[map(str, column) for column in columns], fillvalue='')]
+    return rows[:n] + ['\t' * len(columns)] * (n - len(rows))
+
+
+def mask_invalid(data):  # copy of rows with invalid eyes set to -1, as in TSV
+    data = data.copy()
+    for eye, names in EYE_FIELDS.items():
+        bad = data[eye + 'Validity'] == INVALID
+        for name in names:
+            data[name][bad] = -1.0
+    return data
+
+
+class SampleStore:
+
+    # capacity: number of rows allocated up front; doubled when it runs out
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, rows):  # appends a list (or array) of rows at once
+        block = np.array(rows, dtype=SAMPLE_DTYPE)
+        n = self.count
+        while n + len(block) > self.capacity:
+            self.grow()
+        self.data[n:n + len(block)] = block
+        self.count += len(block)  # bumped last so readers never see a partial row
+
+    def grow(self):  # doubles the allocation, keeping the rows so far
+        data = np.zeros(2 * self.capacity, dtype=SAMPLE_DTYPE)
+        data[:self.count] = self.data[:self.count]
+        self.data = data
+        self.capacity *= 2
+
+    def array(self):  # stored rows, oldest first
+        return self.data[:self.count]
+
+    def clear(self):
+        self.count = 0
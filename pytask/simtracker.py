@@ -0,0 +1,334 @@
+'''
+Simulated eye tracker with the same interface as TobiiController, for running
+the tasks and load-testing the recording and saving paths without Tobii
+hardware. Samples come at a set rate from a synthetic pupil model (with
+blinks, dropouts and dilations after each recorded event), or are replayed
+in real time from a data file such as those in pyanalysis/data.
+
+usage: python simtracker.py [-d SECONDS] [-r RATE] [--replay TSV]
+                            [--streaming] [--binary] [-o OUTFILE]
+
+runs a session without PsychoPy, recording an event every second, and reports
+the sample rate achieved and the time taken to save the data file. each event
+gets a trial number added before it is recorded (as imagetest adds isfear
+before imagetime) and a response added after it (as revlearn adds correct
+after soundtime), and both are checked in the events file as read back by
+utils.read_events in pyanalysis.
+'''
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import recorder
+import samplestore
+
+# pupil response to an event (Hoeks & Levelt, 1993): h(t) = t^n e^(-n t/tmax),
+# scaled to peak at 1 at tmax seconds after the event
+RESPONSE_N = 10.1
+RESPONSE_TMAX = 0.93
+RESPONSE_LENGTH = 4.0  # seconds after an event that it still has an effect
+
+
+def response(t):
+    x = t / RESPONSE_TMAX
+    return x ** RESPONSE_N * math.exp(RESPONSE_N * (1 - x))
+
+
+class SyntheticSource:
+
+    # rate: samples per second
+    # pupil: mean pupil diameter (mm) of the left eye; the right is 0.1 larger
+    # dilation: peak change in diameter (mm) after an event
+    # blink_rate, dropout_rate: blinks (both eyes lost for 100-300 ms) and
+    # dropouts (one eye lost for 20-100 ms) per second
+    def __init__(self, rate, pupil=3.5, dilation=0.3, blink_rate=0.25,
+                 dropout_rate=0.5, seed=None):
+        self.rate = float(rate)
+        self.pupil = pupil
+        self.dilation = dilation
+        self.blink_rate = blink_rate
+        self.dropout_rate = dropout_rate
+        self.random = random.Random(seed)
+        self.events = []  # times (s from the start) of recorded events
+        self.index = 0
+        self.drift = 0.0
+        self.lost = [0.0, 0.0]  # time until which each eye is invalid
+
+    def addEvent(self, t):
+        self.events.append(t)
+
+    def next(self):  # (seconds from the start, sample without timestamp)
+        rnd = self.random
+        t = self.index / self.rate
+        self.index += 1
+        dt = 1 / self.rate
+
+        # slow fluctuation of the pupil: mean-reverting random walk
+        self.drift += (-self.drift * dt / 2.0 +
+                       0.15 * math.sqrt(dt) * rnd.gauss(0, 1))
+        size = self.pupil + self.drift
+        for te in self.events[-16:]:
+            if 0 < t - te < RESPONSE_LENGTH:
+                size += self.dilation * response(t - te)
+
+        if rnd.random() < self.blink_rate * dt:
+            end = t + rnd.uniform(0.1, 0.3)
+            self.lost = [max(self.lost[0], end), max(self.lost[1], end)]
+        if rnd.random() < self.dropout_rate * dt:
+            eye = rnd.randint(0, 1)
+            self.lost[eye] = max(self.lost[eye], t + rnd.uniform(0.02, 0.1))
+
+        row = ()
+        for eye, offset in ((0, -30.0), (1, 30.0)):
+            if t < self.lost[eye]:
+                row += (-1.0,) * 12 + (samplestore.INVALID,)
+                continue
+            gx = 0.5 + rnd.gauss(0, 0.01)
+            gy = 0.5 + rnd.gauss(0, 0.01)
+            row += (offset + rnd.gauss(0, 0.2), rnd.gauss(0, 0.2),
+                    600 + rnd.gauss(0, 0.5),  # eye position (mm)
+                    0.5 + offset / 200, 0.5, 0.5,  # relative to the track box
+                    (gx - 0.5) * 376, (0.5 - gy) * 301, 0.0,  # gaze (mm)
+                    gx, gy,
+                    size + 0.1 * eye + rnd.gauss(0, 0.01), 0)
+        return t, row
+
+
+class ReplaySource:
+
+    # path: data file (TSV) whose gaze columns are replayed with their
+    # original timing; it starts over when it ends if loop is True. most
+    # files in pyanalysis/data have every gaze column and are replayed as
+    # recorded. files with only some of them (oddball.tsv has just Timestamp
+    # and the pupils) get fixed values for the others, and an eye without a
+    # validity column is invalid where its pupil is -1
+    def __init__(self, path, loop=True):
+        self.rows = []
+        with open(path) as datafile:
+            header = datafile.readline().rstrip('\n').split('\t')
+            for line in datafile:
+                cells = dict(zip(header, line.rstrip('\n').split('\t')))
+                if cells.get('Timestamp', ''):
+                    self.rows.append(replay_row(cells))
+        if len(self.rows) < 2:
+            raise ValueError('no gaze samples in %s' % path)
+        self.start = self.rows[0][0]
+        # one sample interval between the last sample and the repeat
+        self.length = (self.rows[-1][0] - self.start + self.rows[1][0] -
+                       self.start) / 1e6
+        self.loop = loop
+        self.index = 0
+
+    def addEvent(self, t):
+        pass
+
+    def next(self):
+        n = len(self.rows)
+        if self.index == n and not self.loop:
+            return None
+        repeat, i = divmod(self.index, n)
+        self.index += 1
+        row = self.rows[i]
+        return (row[0] - self.start) / 1e6 + repeat * self.length, row[1:]
+
+# point values of each eye looking at the centre of the screen
+CENTRE = {'Left': ((-30.0, 0.0, 600.0), (0.35, 0.5, 0.5), (0.0, 0.0, 0.0),
+                   (0.5, 0.5)),
+          'Right': ((30.0, 0.0, 600.0), (0.65, 0.5, 0.5), (0.0, 0.0, 0.0),
+                    (0.5, 0.5))}
+
+
+def replay_row(cells):  # sample tuple from the cells of a data file row
+    row = (float(cells['Timestamp']),)
+    for eye in ('Left', 'Right'):
+        pupil = float(cells.get(eye + 'Pupil', -1))
+        if eye + 'Validity' in cells:
+            validity = int(cells[eye + 'Validity'])
+        else:
+            validity = samplestore.INVALID if pupil == -1 else 0
+        for (point, coords), centre in zip(samplestore.POINTS, CENTRE[eye]):
+            if eye + point in cells:
+                row += tuple(float(v) for v in
+                             cells[eye + point].strip('()').split(','))
+            else:
+                row += centre
+        row += (pupil, validity)
+    return row
+
+
+class SourceThread(threading.Thread):  # passes samples on at their times
+
+    def __init__(self, source, callback, start):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.source = source
+        self.callback = callback
+        self.start_time = start
+        self.stopped = threading.Event()
+        self.late = 0.0  # largest delay (s) of a sample behind its time
+
+    def run(self):
+        while not self.stopped.is_set():
+            sample = self.source.next()
+            if sample is None:
+                break
+            t, row = sample
+            t += self.start_time
+            wait = t - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            else:  # fell behind: catch up back to back, as the SDK does
+                self.late = max(self.late, -wait)
+            self.callback((t * 1e6,) + row)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class SimulatedEyetracker:  # stands in for the SDK object used in calibrate.py
+
+    def GetCalibration(self, callback=None):
+        return None
+
+
+class SimulatedController(recorder.Recorder):
+
+    # rate: samples per second of the synthetic source (60-1200 Hz)
+    # replay: data file to replay instead of synthetic samples
+    # seed: seed of the synthetic source, for repeatable sessions
+    def __init__(self, testWin=None, experWin=None, rate=300, replay=None,
+                 seed=None):
+        recorder.Recorder.__init__(self)
+        self.testWin = testWin
+        self.experWin = experWin
+        self.rate = rate
+        self.replay = replay
+        self.seed = seed
+        self.source = None
+        self.thread = None
+        self.startTime = None
+        self.eyetracker = SimulatedEyetracker()
+        self.eyetrackers = {'simulated': None}
+
+    def waitForFindEyeTracker(self):
+        pass
+
+    def activate(self, eyetracker):
+        print 'Using a simulated eye tracker'
+
+    def destroy(self):
+        if self.thread is not None:
+            self.stopSource()
+        self.eyetracker = None
+
+    def doCalibration(self, calibrationPoints):
+        return 'accept'
+
+    def startSource(self):
+        if self.replay is not None:
+            self.source = ReplaySource(self.replay)
+        else:
+            self.source = SyntheticSource(self.rate, seed=self.seed)
+        self.startTime = time.time()
+        self.thread = SourceThread(self.source, self.addSample,
+                                   self.startTime)
+        self.thread.start()
+
+    def stopSource(self):
+        self.thread.stop()
+        self.thread = None
+
+    # the simulated tracker timestamps samples with the local clock
+    def getLocalTime(self):
+        return int(time.time() * 1e6)
+
+    def localToTracker(self, t):
+        return t
+
+    def recordEvent(self, event, t=None):  # also used for flip-timed events
+        recorder.Recorder.recordEvent(self, event, t)
+        if self.source is not None:  # the synthetic pupil dilates after it
+            self.source.addEvent(self.eventData[event][-1] / 1e6 -
+                                 self.startTime)
+
+
+def check_events(path, ntrials):
+    """
+    whether the events file of the data file at path, read back by
+    pyanalysis' utils.read_events, has the trial and response of each of
+    ntrials events as main recorded them
+    """
+    os.environ.setdefault('MPLBACKEND', 'Agg')  # utils imports pyplot
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(
+        __file__)), '..', 'pyanalysis'))
+    import utils
+    events, params = utils.read_events(path)
+    trials = events[events['event'] == 'eventtime']
+    return (list(trials['trial']) == range(ntrials) and
+            list(trials['response']) == [10 * i for i in range(ntrials)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-d', '--duration', type=float, default=120,
+                        help='seconds to record')
+    parser.add_argument('-r', '--rate', type=float, default=300,
+                        help='samples per second of the synthetic source')
+    parser.add_argument('--replay', default=None,
+                        help='data file to replay instead')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--binary', action='store_true')
+    parser.add_argument('-o', '--output', default=None,
+                        help='data file to write (default: a temporary file)')
+    args = parser.parse_args(argv)
+
+    if args.output is None:
+        fd, path = tempfile.mkstemp(suffix='.tsv')
+        os.close(fd)
+    else:
+        path = args.output
+    cont = SimulatedController(rate=args.rate, replay=args.replay, seed=0)
+    cont.streaming = args.streaming
+    cont.binary = args.binary
+    with open(path, 'w') as datafile:
+        cont.setDataFile(datafile)
+        cont.startTracking()
+        cont.setEventsAndParams(['task', 'eventtime', 'trial', 'response'])
+        cont.setParam('task', 'simulated')
+        start = time.time()
+        ntrials = 0
+        while time.time() - start < args.duration:
+            cont.addParam('trial', ntrials, event='eventtime')
+            time.sleep(min(1.0, args.duration - (time.time() - start)))
+            cont.recordEvent('eventtime')
+            cont.addParam('response', 10 * ntrials)
+            ntrials += 1
+        nsamples = cont.queue.received
+        late = cont.thread.late
+        elapsed = time.time() - start
+        save_start = time.time()
+        cont.stopTracking()
+        save = time.time() - save_start
+        cont.closeDataFile()
+
+    print '%d samples in %.1f s (%.1f Hz), at most %.1f ms late' % (
+        nsamples, elapsed, nsamples / elapsed, 1000 * late)
+    print 'stopTracking (save) took %.3f s, data file %d bytes' % (
+        save, os.path.getsize(path))
+    same = check_events(path, ntrials)
+    print 'trial values in the events file: %s' % ('ok' if same else 'WRONG')
+    if args.output is None:
+        base = os.path.splitext(path)[0]
+        for leftover in (path, base + '.events.tsv', base + '.npz'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return 0 if same else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
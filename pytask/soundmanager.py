@@ -0,0 +1,82 @@
+'''
+Loads the task sounds once at startup and plays them on the audio stream that
+is kept open from then on, so that a trial's play() does not read a file or
+open the device. Each play returns an offset to add to the sound's event
+time:
+
+offset = time spent in play() + one buffer of the audio server
+         + output latency configured for the setup
+
+Only the first part is measured. The output latency of the sound card,
+driver and speakers is not something the audio server reports reliably, so
+it is a setting ('Sound: Output Latency (ms)') that has to be calibrated once
+per setup, e.g. with a microphone at the speaker or a cable from the output
+back to an input. Until it is, the offset is only a few ms.
+'''
+import os
+
+from psychopy import prefs
+prefs.general['audioLib'] = ['pyo']
+from psychopy import core, sound
+
+SOUND_PATH = '../task/'
+SOUND_FILES = ['500.wav', '1000.wav', 'buzz1.wav', 'dinga.wav']
+SAMPLE_RATE = 44100
+BUFFER_SIZE = 128  # samples per buffer of the audio server; smaller is faster
+
+
+def buffer_latency():  # seconds of audio the server holds before output
+    server = getattr(sound, 'pyoSndServer', None)
+    if server is None:
+        return BUFFER_SIZE / float(SAMPLE_RATE)
+    return server.getBufferSize() / float(server.getSamplingRate())
+
+
+class SoundManager:
+
+    # path: folder of the sound files
+    # names: file names of the sounds to load
+    # output_latency: seconds from the audio server to the speakers,
+    # calibrated once for the setup; added to every offset
+    def __init__(self, path=SOUND_PATH, names=SOUND_FILES, output_latency=0.0):
+        init = getattr(sound, 'initPyo', None)
+        if init is not None and getattr(sound, 'pyoSndServer', None) is None:
+            init(rate=SAMPLE_RATE, buffer=BUFFER_SIZE)
+        self.sounds = {}
+        for name in names:
+            self.sounds[name] = sound.Sound(os.path.join(path, name))
+        self.output_latency = output_latency
+        if output_latency <= 0:
+            print ('Sound: output latency is not calibrated; sound offsets '
+                   'leave it out')
+        self.buffer_latency = buffer_latency()
+        self.calls = []  # seconds spent in each play() of a task
+        self.warm()
+
+    def warm(self):
+        """
+        plays every sound once silently, so that the first play of each in a
+        task does not pay for allocating its table and starting the stream
+        """
+        for snd in self.sounds.values():
+            snd.setVolume(0)
+            snd.play()
+            core.wait(0.05)
+            snd.stop()
+            snd.setVolume(1)
+
+    def play(self, name):  # plays a loaded sound, returns its offset (s)
+        start = core.getTime()
+        self.sounds[name].play()
+        call = core.getTime() - start
+        self.calls.append(call)
+        return call + self.buffer_latency + self.output_latency
+
+    def report(self):
+        if len(self.calls) == 0:
+            return
+        print ('Sounds: %d played, play() %.2f ms max, buffer %.2f ms, '
+               'output %.2f ms' % (
+                   len(self.calls), 1000 * max(self.calls),
+                   1000 * self.buffer_latency, 1000 * self.output_latency))
+        self.calls = []